@@ -1,6 +1,8 @@
 """
 Module xuất báo cáo SWOT ra file Excel với biểu đồ và format chuyên nghiệp
 """
+import logging
+import time
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
@@ -9,6 +11,7 @@ from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.chart import PieChart, BarChart, Reference
 from openpyxl.drawing.image import Image
 from openpyxl.utils import get_column_letter
+from openpyxl.workbook.properties import CalcProperties
 from io import BytesIO
 import base64
 from typing import Dict, Any, List, Optional
@@ -23,6 +26,82 @@ try:
 except ImportError:
     HAS_MATPLOTLIB = False
 
+logger = logging.getLogger(__name__)
+
+# Kiểm tra Kaleido/Chrome: chỉ nhớ kết quả thành công; khi thất bại thì
+# thử lại sau _KALEIDO_RETRY_SECONDS (lỗi có thể chỉ tạm thời, vd. Chrome khởi động chậm)
+_HAS_KALEIDO = False
+_KALEIDO_RETRY_SECONDS = 60
+_kaleido_failed_at = None
+
+
+def _kaleido_available() -> bool:
+    """
+    Kiểm tra xem Plotly có export được ảnh (Kaleido + Chrome) hay không
+    
+    Kết quả thành công được cache ở mức module để các biểu đồ sau không phải
+    dựng figure Plotly rồi bắt exception mỗi lần. Khi thất bại, lỗi được ghi log
+    và chỉ kiểm tra lại sau _KALEIDO_RETRY_SECONDS giây, để các biểu đồ trong
+    cùng lần export dùng ngay matplotlib mà lần export sau vẫn có thể dùng lại Plotly.
+    
+    Returns:
+        True nếu Plotly export được ảnh PNG
+    """
+    global _HAS_KALEIDO, _kaleido_failed_at
+    if _HAS_KALEIDO:
+        return True
+    if _kaleido_failed_at is not None and time.monotonic() - _kaleido_failed_at < _KALEIDO_RETRY_SECONDS:
+        return False
+    
+    try:
+        go.Figure().to_image(format="png", width=2, height=2)
+    except Exception:
+        logger.warning("Plotly không export được ảnh (Kaleido/Chrome), dùng matplotlib thay thế", exc_info=True)
+        _kaleido_failed_at = time.monotonic()
+        return False
+    
+    _HAS_KALEIDO = True
+    _kaleido_failed_at = None
+    return True
+
+
+def _render(plotly_fig_builder, mpl_fig_builder, width: int, height: int) -> Optional[BytesIO]:
+    """
+    Render biểu đồ ra PNG bằng Plotly, fallback sang matplotlib nếu thiếu Chrome/Kaleido
+    
+    Args:
+        plotly_fig_builder: Hàm không tham số trả về go.Figure
+        mpl_fig_builder: Hàm nhận matplotlib Axes để vẽ lại biểu đồ (None nếu không có fallback)
+        width: Chiều rộng ảnh (pixel)
+        height: Chiều cao ảnh (pixel)
+    
+    Returns:
+        BytesIO chứa ảnh PNG, hoặc None nếu không thể render
+    """
+    if _kaleido_available():
+        try:
+            fig = plotly_fig_builder()
+            return BytesIO(fig.to_image(format="png", width=width, height=height))
+        except Exception:
+            # Lỗi thật sự khi render (không phải thiếu Chrome), bỏ qua chart này
+            return None
+    
+    # Không có Chrome/Kaleido -> vẽ bằng matplotlib nếu có
+    if mpl_fig_builder is None or not HAS_MATPLOTLIB:
+        return None
+    
+    try:
+        fig, ax = plt.subplots(figsize=(width / 100, height / 100))
+        mpl_fig_builder(ax)
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
+        plt.close(fig)
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        # Nếu matplotlib cũng lỗi, bỏ qua chart này
+        return None
+
 
 def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
     """
@@ -47,10 +126,14 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
         len(swot.get("Threats", []))
     ]
     
+    # Không có item SWOT nào và không có action plan -> không cần khởi động Kaleido
+    # (impact_levels và priority matrix cũng sẽ rỗng khi counts đều bằng 0)
+    if sum(counts) == 0 and not swot_data.get("Strategic_Action_Plan"):
+        return charts
+
     colors = ['#2ecc71', '#e74c3c', '#3498db', '#f39c12']
-    
-    # Thử dùng Plotly trước
-    try:
+
+    def _pie_plotly():
         fig_pie = go.Figure(data=[go.Pie(
             labels=categories,
             values=counts,
@@ -60,32 +143,20 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
         )])
         fig_pie.update_layout(
             title='Phân bố SWOT Analysis',
-            width=600,
-            height=400,
+            width=400,
+            height=300,
             showlegend=True
         )
-        
-        # Export pie chart
-        pie_img = fig_pie.to_image(format="png", width=600, height=400)
-        charts['pie_chart'] = BytesIO(pie_img)
-    except (RuntimeError, Exception) as e:
-        # Nếu lỗi (thường là do thiếu Chrome), thử dùng matplotlib
-        if "Chrome" in str(e) or "kaleido" in str(e).lower():
-            if HAS_MATPLOTLIB:
-                try:
-                    fig, ax = plt.subplots(figsize=(6, 4))
-                    ax.pie(counts, labels=categories, colors=colors, autopct='%1.1f%%', startangle=90)
-                    ax.set_title('Phân bố SWOT Analysis')
-                    
-                    pie_buffer = BytesIO()
-                    plt.savefig(pie_buffer, format='png', dpi=100, bbox_inches='tight')
-                    pie_buffer.seek(0)
-                    charts['pie_chart'] = pie_buffer
-                    plt.close(fig)
-                except Exception as e2:
-                    # Nếu matplotlib cũng lỗi, bỏ qua chart này
-                    pass
-        # Nếu không phải lỗi Chrome, bỏ qua chart này
+        return fig_pie
+    
+    def _pie_mpl(ax):
+        ax.pie(counts, labels=categories, colors=colors, autopct='%1.1f%%', startangle=90)
+        ax.set_title('Phân bố SWOT Analysis')
+    
+    # Export pie chart (đúng kích thước hiển thị trên sheet)
+    pie_buffer = _render(_pie_plotly, _pie_mpl, 400, 300)
+    if pie_buffer is not None:
+        charts['pie_chart'] = pie_buffer
     
     # 2. Bar chart Impact/Risk Level
     impact_levels = {'High': 0, 'Medium': 0, 'Low': 0}
@@ -100,13 +171,14 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
         if risk in impact_levels:
             impact_levels[risk] += 1
     
-    # Thử dùng Plotly trước
-    try:
+    bar_colors = ['#e74c3c', '#f39c12', '#2ecc71']
+    
+    def _bar_plotly():
         fig_bar = go.Figure(data=[
             go.Bar(
                 x=list(impact_levels.keys()),
                 y=list(impact_levels.values()),
-                marker_color=['#e74c3c', '#f39c12', '#2ecc71'],
+                marker_color=bar_colors,
                 text=list(impact_levels.values()),
                 textposition='auto'
             )
@@ -115,40 +187,27 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
             title='Phân bố Mức độ Ảnh hưởng/Rủi ro',
             xaxis_title='Mức độ',
             yaxis_title='Số lượng',
-            width=600,
-            height=400
+            width=400,
+            height=300
         )
+        return fig_bar
+    
+    def _bar_mpl(ax):
+        bars = ax.bar(list(impact_levels.keys()), list(impact_levels.values()), color=bar_colors)
+        ax.set_title('Phân bố Mức độ Ảnh hưởng/Rủi ro')
+        ax.set_xlabel('Mức độ')
+        ax.set_ylabel('Số lượng')
         
-        # Export bar chart
-        bar_img = fig_bar.to_image(format="png", width=600, height=400)
-        charts['bar_chart'] = BytesIO(bar_img)
-    except (RuntimeError, Exception) as e:
-        # Nếu lỗi (thường là do thiếu Chrome), thử dùng matplotlib
-        if "Chrome" in str(e) or "kaleido" in str(e).lower():
-            if HAS_MATPLOTLIB:
-                try:
-                    fig, ax = plt.subplots(figsize=(6, 4))
-                    bars = ax.bar(list(impact_levels.keys()), list(impact_levels.values()), 
-                                  color=['#e74c3c', '#f39c12', '#2ecc71'])
-                    ax.set_title('Phân bố Mức độ Ảnh hưởng/Rủi ro')
-                    ax.set_xlabel('Mức độ')
-                    ax.set_ylabel('Số lượng')
-                    
-                    # Thêm số trên mỗi cột
-                    for bar in bars:
-                        height = bar.get_height()
-                        ax.text(bar.get_x() + bar.get_width()/2., height,
-                               f'{int(height)}', ha='center', va='bottom')
-                    
-                    bar_buffer = BytesIO()
-                    plt.savefig(bar_buffer, format='png', dpi=100, bbox_inches='tight')
-                    bar_buffer.seek(0)
-                    charts['bar_chart'] = bar_buffer
-                    plt.close(fig)
-                except Exception as e2:
-                    # Nếu matplotlib cũng lỗi, bỏ qua chart này
-                    pass
-        # Nếu không phải lỗi Chrome, bỏ qua chart này
+        # Thêm số trên mỗi cột
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                   f'{int(height)}', ha='center', va='bottom')
+    
+    # Export bar chart (đúng kích thước hiển thị trên sheet)
+    bar_buffer = _render(_bar_plotly, _bar_mpl, 400, 300)
+    if bar_buffer is not None:
+        charts['bar_chart'] = bar_buffer
     
     # 3. Priority Matrix Chart (Enterprise)
     try:
@@ -172,7 +231,8 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
                     'color': color_map[category]
                 })
         
-        if items:
+        # Chart này chỉ có bản Plotly, bỏ qua luôn nếu không export được ảnh
+        if items and _kaleido_available():
             import numpy as np
             np.random.seed(42)
             
@@ -203,21 +263,23 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
                 yaxis_title='Điểm Ưu tiên',
                 xaxis=dict(tickmode='array', tickvals=[1, 2, 3], ticktext=['Low', 'Medium', 'High'], range=[0.5, 3.5]),
                 yaxis=dict(range=[0, 10]),
-                width=700,
-                height=500,
+                width=500,
+                height=350,
                 showlegend=True,
                 legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="center", x=0.5)
             )
             
-            priority_img = fig_priority.to_image(format="png", width=700, height=500)
-            charts['priority_matrix'] = BytesIO(priority_img)
+            # Render đúng kích thước hiển thị trên sheet (500x350)
+            priority_buffer = _render(lambda: fig_priority, None, 500, 350)
+            if priority_buffer is not None:
+                charts['priority_matrix'] = priority_buffer
     except Exception as e:
         pass  # Skip if chart creation fails
     
     # 4. Action Timeline Chart (Enterprise)
     try:
         action_plan = swot_data.get("Strategic_Action_Plan", [])
-        if action_plan:
+        if action_plan and _kaleido_available():
             actions = []
             priorities = []
             colors_list = []
@@ -251,17 +313,22 @@ def create_swot_charts(swot_data: Dict[str, Any]) -> Dict[str, BytesIO]:
                 hovertemplate='%{y}<br>Priority: %{x}<br>Timeline: %{text}<extra></extra>'
             ))
             
+            # Chiều cao tăng theo số hành động (có giới hạn) để nhãn không chồng lên nhau
+            action_height = min(max(350, len(actions) * 45), 720)
+            
             fig_action.update_layout(
                 title='Kế hoạch Hành động theo Ưu tiên',
                 xaxis_title='Mức độ Ưu tiên',
-                width=900,
-                height=max(350, len(actions) * 45),
-                margin=dict(l=300, r=50, t=60, b=60),
+                width=600,
+                height=action_height,
+                margin=dict(l=230, r=30, t=60, b=50),
                 showlegend=False
             )
             
-            action_img = fig_action.to_image(format="png", width=900, height=max(350, len(actions) * 45))
-            charts['action_timeline'] = BytesIO(action_img)
+            # Render đúng chiều rộng hiển thị trên sheet (600px)
+            action_buffer = _render(lambda: fig_action, None, 600, action_height)
+            if action_buffer is not None:
+                charts['action_timeline'] = action_buffer
 
     except Exception as e:
         pass  # Skip if chart creation fails
@@ -285,6 +352,9 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
     """
     wb = Workbook()
     wb.remove(wb.active)  # Xóa sheet mặc định
+    # Workbook không có công thức -> không để Excel tính lại toàn bộ khi mở file
+    # (giữ calcMode='auto' mặc định: chế độ tính toán áp dụng cho cả phiên Excel, không chỉ file này)
+    wb.calculation = CalcProperties(fullCalcOnLoad=False)
     
     # Tạo các biểu đồ (có thể rỗng nếu không có Chrome/Kaleido)
     try:
@@ -375,17 +445,14 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
     if 'action_timeline' in charts:
         charts['action_timeline'].seek(0)
         img = Image(charts['action_timeline'])
+        # Giữ chiều cao của ảnh đã render (tăng theo số hành động)
         img.width = 600
-        img.height = 350
         ws_summary.add_image(img, 'F23')
         ws_summary['F22'] = "KẾ HOẠCH HÀNH ĐỘNG"
         ws_summary['F22'].font = Font(name='Arial', size=14, bold=True)
     
     # Điều chỉnh độ rộng cột
-    ws_summary.column_dimensions['A'].width = 30
-    ws_summary.column_dimensions['B'].width = 15
-    ws_summary.column_dimensions['C'].width = 15
-    ws_summary.column_dimensions['D'].width = 15
+    _set_widths(ws_summary, [30, 15, 15, 15])
 
     
     # ========== SHEET 2: KEY INSIGHTS ==========
@@ -403,8 +470,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
             ws_insights.cell(row=idx, column=2).value = insight
             ws_insights.cell(row=idx, column=2).alignment = Alignment(wrap_text=True)
         
-        ws_insights.column_dimensions['A'].width = 5
-        ws_insights.column_dimensions['B'].width = 80
+        _set_widths(ws_insights, [5, 80])
     
     # ========== SHEET 3: STRENGTHS (với cột mở rộng) ==========
     ws_strengths = wb.create_sheet("Strengths")
@@ -465,9 +531,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
     if not has_strategies:
         ws_tows.cell(row=3, column=1).value = "Không có dữ liệu chiến lược TOWS"
     
-    ws_tows.column_dimensions['A'].width = 50
-    ws_tows.column_dimensions['B'].width = 30
-    ws_tows.column_dimensions['C'].width = 30
+    _set_widths(ws_tows, [50, 30, 30])
 
     
     # ========== SHEET 8: ACTION PLAN (always create) ==========
@@ -501,13 +565,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
     else:
         ws_action.cell(row=3, column=1).value = "Không có kế hoạch hành động"
     
-    ws_action.column_dimensions['A'].width = 10
-    ws_action.column_dimensions['B'].width = 50
-    ws_action.column_dimensions['C'].width = 20
-    ws_action.column_dimensions['D'].width = 15
-    ws_action.column_dimensions['E'].width = 20
-    ws_action.column_dimensions['F'].width = 15
-    ws_action.column_dimensions['G'].width = 40
+    _set_widths(ws_action, [10, 50, 20, 15, 20, 15, 40])
     
     # ========== SHEET 9: COMPETITIVE ANALYSIS (always create) ==========
     competitive = swot_data.get("Competitive_Analysis", {})
@@ -538,8 +596,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
     else:
         ws_comp.cell(row=3, column=1).value = "Không có dữ liệu cạnh tranh"
     
-    ws_comp.column_dimensions['A'].width = 30
-    ws_comp.column_dimensions['B'].width = 20
+    _set_widths(ws_comp, [30, 20])
 
     
     # ========== SHEET 10: DỮ LIỆU GỐC (nếu có) ==========
@@ -570,10 +627,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
                 )
         
         # Điều chỉnh độ rộng cột
-        from openpyxl.utils import get_column_letter
-        for col_idx in range(1, len(df.columns) + 1):
-            col_letter = get_column_letter(col_idx)
-            ws_data.column_dimensions[col_letter].width = 30
+        _set_widths(ws_data, [30] * len(df.columns))
     
     # ========== SHEET 11: THỐNG KÊ FILE (nếu có) ==========
     if file_info:
@@ -606,9 +660,7 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
                 )
         
         # Điều chỉnh độ rộng cột
-        ws_files.column_dimensions['A'].width = 40
-        for col in ['B', 'C', 'D']:
-            ws_files.column_dimensions[col].width = 15
+        _set_widths(ws_files, [40, 15, 15, 15])
     
     # Lưu vào BytesIO
     output = BytesIO()
@@ -620,6 +672,18 @@ def export_swot_to_excel(swot_data: Dict[str, Any], df: pd.DataFrame = None,
 
 
 
+def _set_widths(ws, widths: List[float]):
+    """
+    Đặt độ rộng cột cho worksheet theo thứ tự A, B, C...
+    
+    Args:
+        ws: Worksheet object
+        widths: Danh sách độ rộng cột, bắt đầu từ cột A
+    """
+    for col_idx, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+
 def _create_swot_sheet(ws, title: str, items: List[Dict], columns: List[str]):
     """
     Tạo sheet cho một nhóm SWOT
@@ -635,7 +699,8 @@ def _create_swot_sheet(ws, title: str, items: List[Dict], columns: List[str]):
     ws['A1'].font = Font(name='Arial', size=14, bold=True, color='FFFFFF')
     ws['A1'].fill = PatternFill(start_color='1f77b4', end_color='1f77b4', fill_type='solid')
     ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-    ws.merge_cells(f'A1:{chr(64 + len(columns))}1')
+    last_col = get_column_letter(len(columns))
+    ws.merge_cells(f'A1:{last_col}1')
     ws.row_dimensions[1].height = 30
     
     # Column headers
@@ -695,10 +760,7 @@ def _create_swot_sheet(ws, title: str, items: List[Dict], columns: List[str]):
 
     
     # Điều chỉnh độ rộng cột
-    ws.column_dimensions['A'].width = 25  # Chủ đề
-    ws.column_dimensions['B'].width = 50  # Mô tả
-    for col in ['C', 'D', 'E']:
-        ws.column_dimensions[col].width = 25
+    _set_widths(ws, [25, 50, 25, 25, 25])  # Chủ đề, Mô tả, các cột còn lại
     
     # Điều chỉnh chiều cao hàng
     for row in range(3, len(items) + 3):
@@ -3,32 +3,30 @@ Script hỗ trợ setup nhanh cho SWOT AI Analyzer
 """
 import os
 import sys
+from importlib.metadata import distribution, PackageNotFoundError
 
 def check_dependencies():
     """Kiểm tra các dependencies cần thiết"""
     print("🔍 Đang kiểm tra dependencies...")
     
+    # (tên module, tên distribution trên PyPI)
     required_packages = [
-        'streamlit',
-        'pandas',
-        'openpyxl',
-        'google.generativeai',
-        'dotenv',
-        'plotly'
+        ('streamlit', 'streamlit'),
+        ('pandas', 'pandas'),
+        ('openpyxl', 'openpyxl'),
+        ('google.generativeai', 'google-generativeai'),
+        ('dotenv', 'python-dotenv'),
+        ('plotly', 'plotly')
     ]
     
     missing_packages = []
     
-    for package in required_packages:
+    for package, dist_name in required_packages:
         try:
-            if package == 'google.generativeai':
-                __import__('google.generativeai')
-            elif package == 'dotenv':
-                __import__('dotenv')
-            else:
-                __import__(package)
+            # Chỉ đọc metadata đã cài (không import/thực thi code của package)
+            distribution(dist_name)
             print(f"  ✅ {package}")
-        except ImportError:
+        except PackageNotFoundError:
             print(f"  ❌ {package} - CHƯA CÀI ĐẶT")
             missing_packages.append(package)
     
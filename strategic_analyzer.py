@@ -2,8 +2,46 @@
 Strategic Analyzer Module - Enterprise-level SWOT Analysis Tools
 Provides TOWS Matrix, Priority Scoring, Risk Assessment, and Action Planning
 """
-from typing import Dict, List, Any, Optional
-import pandas as pd
+import heapq
+import itertools
+import re
+from operator import itemgetter
+from typing import Dict, List, Any
+import numpy as np
+
+
+# Expanded keywords (English + Vietnamese) for competitive dimension detection
+_DIMENSION_KEYWORDS = {
+    'quality': ('quality', 'taste', 'fresh', 'delicious', 'premium', 'standard',
+               'chất lượng', 'ngon', 'vị', 'tươi', 'menu', 'đồ uống', 'bánh', 'sản phẩm', 'đậm đà'),
+    'price': ('price', 'cost', 'expensive', 'cheap', 'affordable', 'value', 'money',
+             'giá', 'chi phí', 'đắt', 'rẻ', 'hợp lý', 'tiền', 'ví', 'khuyến mãi'),
+    'service': ('service', 'staff', 'friendly', 'slow', 'fast', 'attitude',
+               'phục vụ', 'nhân viên', 'thái độ', 'chậm', 'nhanh', 'thân thiện', 'dịch vụ', 'order', 'nhiệt tình'),
+    'location': ('location', 'place', 'parking', 'space', 'view', 'center',
+                'vị trí', 'không gian', 'chỗ ngồi', 'view', 'đẹp', 'thoáng', 'gửi xe', 'bãi xe', 'trang trí', 'decor'),
+    'brand': ('brand', 'reputation', 'image', 'famous', 'popular', 'known', 'marketing', 'awareness',
+             'thương hiệu', 'nổi tiếng', 'uy tín', 'quen thuộc', 'hình ảnh', 'tin dùng'),
+    'innovation': ('innovation', 'creative', 'new', 'unique', 'technology', 'app', 'digital',
+                  'mới lạ', 'sáng tạo', 'app', 'công nghệ', 'độc đáo', 'khác biệt', 'trend', 'xu hướng')
+}
+
+# One precompiled alternation per dimension: a single regex search per item
+# replaces the Python-level any(k in text for k in keywords) loop
+_DIMENSION_PATTERNS = {
+    dim: re.compile('|'.join(re.escape(k) for k in kws))
+    for dim, kws in _DIMENSION_KEYWORDS.items()
+}
+
+
+def _matched_dimensions(text: str) -> List[str]:
+    """Dimensions whose keywords occur in the (lowercased) text"""
+    return [dim for dim, pattern in _DIMENSION_PATTERNS.items() if pattern.search(text)]
+
+
+def _item_text(item: Dict[str, Any]) -> str:
+    """Lowercased 'topic description' text of a SWOT item"""
+    return (item.get('topic', '') + ' ' + item.get('description', '')).lower()
 
 
 class StrategicAnalyzer:
@@ -30,6 +68,57 @@ class StrategicAnalyzer:
         'Low': 2
     }
     
+    # Risk tiers for composite risk score (category, recommendation)
+    RISK_TIER_BOUNDS = (2, 4, 6)
+    RISK_TIERS = (
+        ('Low', 'Theo dõi định kỳ, không cần hành động ngay'),
+        ('Medium', 'Theo dõi và chuẩn bị phương án dự phòng'),
+        ('High', 'Cần lập kế hoạch ứng phó trong vòng 30 ngày'),
+        ('Critical', 'Cần hành động ngay lập tức, ưu tiên cao nhất')
+    )
+    
+    # Cost/investment level to feasibility, time-to-capture to urgency
+    COST_FEASIBILITY = {'Low': 8, 'Medium': 5, 'High': 3}
+    TIME_URGENCY = {'Short term': 9, 'Medium term': 6, 'Long term': 3}
+    
+    # Competitive positioning adjustments by impact/risk level
+    STRENGTH_BOOST = {
+        'High': 4,      # 5 + 4 = 9 (Excellent)
+        'Medium': 2,    # 5 + 2 = 7 (Good)
+        'Low': 1        # 5 + 1 = 6 (Above Avg)
+    }
+    WEAKNESS_PENALTY = {
+        'High': 3,      # 5 - 3 = 2 (Poor)
+        'Medium': 2,    # 5 - 2 = 3 (Below Avg)
+        'Low': 1        # 5 - 1 = 4 (Slightly Below)
+    }
+    THREAT_BOOST = {
+        'High': 3,      # 5 + 3 = 8 (Strong Competitor)
+        'Medium': 2,    # 5 + 2 = 7 (Good Competitor)
+        'Low': 1        # 5 + 1 = 6 (Above Avg)
+    }
+    GAP_DEDUCTION = {
+        'High': 2,    # 5 - 2 = 3 (Weak Competitor)
+        'Medium': 1,  # 5 - 1 = 4 (Below Avg)
+    }
+    
+    # 'Big Competitor' markers in threats -> implies strong competitor brand
+    BIG_COMPETITOR_MARKERS = ('big', 'major', 'chain', 'franchise', 'giant', 'leader')
+    BIG_COMPETITOR_PATTERN = re.compile('|'.join(BIG_COMPETITOR_MARKERS))
+    
+    # Role assignments based on action topic keywords (checked in order)
+    ROLE_KEYWORDS = (
+        ('quality', 'Operations Manager'),
+        ('service', 'Customer Service Manager'),
+        ('marketing', 'Marketing Manager'),
+        ('price', 'Finance Manager'),
+        ('product', 'Product Manager'),
+        ('staff', 'HR Manager'),
+        ('digital', 'IT Manager'),
+        ('brand', 'Marketing Manager'),
+    )
+    DEFAULT_OWNER_ROLE = 'General Manager'
+    
     def __init__(self, weights: Dict[str, float] = None):
         """
         Initialize Strategic Analyzer
@@ -38,6 +127,52 @@ class StrategicAnalyzer:
             weights: Custom weights for priority calculation
         """
         self.weights = weights or self.DEFAULT_WEIGHTS
+        self._wi = self.weights['impact']
+        self._wf = self.weights['feasibility']
+        self._wu = self.weights['urgency']
+        
+        # Category -> (feasibility, urgency) estimator, resolved once per item
+        self._score_fns = {
+            'Strengths': self._score_strength,
+            'Weaknesses': self._score_weakness,
+            'Opportunities': self._score_opportunity,
+            'Threats': self._score_threat
+        }
+    
+    def _score_strength(self, item: Dict[str, Any]):
+        """Strengths are already feasible to leverage, medium urgency"""
+        return 8, 6
+    
+    def _score_weakness(self, item: Dict[str, Any]):
+        """Weaknesses may be harder to fix, higher urgency"""
+        improvement_cost = item.get('improvement_cost', 'Medium')
+        feasibility = self.COST_FEASIBILITY.get(improvement_cost, 5)
+        return feasibility, 7
+    
+    def _score_opportunity(self, item: Dict[str, Any]):
+        """Opportunities have time sensitivity"""
+        time_to_capture = item.get('time_to_capture', 'Medium term')
+        urgency = self.TIME_URGENCY.get(time_to_capture, 6)
+        investment = item.get('required_investment', 'Medium')
+        feasibility = self.COST_FEASIBILITY.get(investment, 5)
+        return feasibility, urgency
+    
+    def _score_threat(self, item: Dict[str, Any]):
+        """Threat urgency from probability and severity, neutral feasibility"""
+        prob_score = self.RISK_SCORES.get(item.get('probability', 'Medium'), 5)
+        sev_score = self.RISK_SCORES.get(item.get('severity', 'Medium'), 5)
+        return 5, (prob_score + sev_score) / 2
+    
+    def _impact_score(self, item: Dict[str, Any]) -> int:
+        """Base impact score of a SWOT item (impact, or risk_level for threats)"""
+        impact_level = item.get('impact') or item.get('risk_level', 'Medium')
+        return self.IMPACT_SCORES.get(impact_level, 5)
+    
+    def _score_components(self, item: Dict[str, Any], category: str):
+        """Return (impact, feasibility, urgency) raw scores for a SWOT item"""
+        # Estimate feasibility/urgency based on category and content (unknown -> Threats)
+        feasibility, urgency = self._score_fns.get(category, self._score_threat)(item)
+        return self._impact_score(item), feasibility, urgency
     
     def calculate_priority_score(self, item: Dict[str, Any], category: str) -> float:
         """
@@ -51,40 +186,10 @@ class StrategicAnalyzer:
         Returns:
             Priority score (0-10)
         """
-        # Get base impact score
-        impact_level = item.get('impact') or item.get('risk_level', 'Medium')
-        impact_score = self.IMPACT_SCORES.get(impact_level, 5)
-        
-        # Estimate feasibility based on category and content
-        if category == 'Strengths':
-            # Strengths are already feasible to leverage
-            feasibility = 8
-            urgency = 6  # Medium urgency to leverage
-        elif category == 'Weaknesses':
-            # Weaknesses may be harder to fix
-            improvement_cost = item.get('improvement_cost', 'Medium')
-            feasibility = {'Low': 8, 'Medium': 5, 'High': 3}.get(improvement_cost, 5)
-            urgency = 7  # Higher urgency to fix
-        elif category == 'Opportunities':
-            # Opportunities have time sensitivity
-            time_to_capture = item.get('time_to_capture', 'Medium term')
-            urgency = {'Short term': 9, 'Medium term': 6, 'Long term': 3}.get(time_to_capture, 6)
-            investment = item.get('required_investment', 'Medium')
-            feasibility = {'Low': 8, 'Medium': 5, 'High': 3}.get(investment, 5)
-        else:  # Threats
-            probability = item.get('probability', 'Medium')
-            severity = item.get('severity', 'Medium')
-            prob_score = self.RISK_SCORES.get(probability, 5)
-            sev_score = self.RISK_SCORES.get(severity, 5)
-            urgency = (prob_score + sev_score) / 2
-            feasibility = 5  # Neutral for threats
+        impact_score, feasibility, urgency = self._score_components(item, category)
         
         # Calculate weighted score
-        score = (
-            impact_score * self.weights['impact'] +
-            feasibility * self.weights['feasibility'] +
-            urgency * self.weights['urgency']
-        )
+        score = impact_score * self._wi + feasibility * self._wf + urgency * self._wu
         
         # Normalize to 0-10 scale
         return round(min(10, max(0, score)), 1)
@@ -113,72 +218,75 @@ class StrategicAnalyzer:
             'WT_Strategies': []   # Mini-Mini: Minimize Weaknesses to avoid Threats
         }
         
+        # Top-3 items per category, computed once and shared by all quadrants
+        top_strengths = heapq.nlargest(3, strengths,
+            key=lambda x: self.IMPACT_SCORES.get(x.get('impact', 'Medium'), 5))
+        top_weaknesses = heapq.nlargest(3, weaknesses,
+            key=lambda x: self.IMPACT_SCORES.get(x.get('impact', 'Medium'), 5))
+        top_opportunities = heapq.nlargest(3, opportunities,
+            key=lambda x: x.get('priority_score', 5))
+        top_threats = heapq.nlargest(3, threats,
+            key=lambda x: self.RISK_SCORES.get(x.get('risk_level', 'Medium'), 5))
+        
         # Generate SO Strategies (Aggressive/Growth strategies)
-        if strengths and opportunities:
-            top_strengths = sorted(strengths, 
-                key=lambda x: self.IMPACT_SCORES.get(x.get('impact', 'Medium'), 5), 
-                reverse=True)[:3]
-            top_opportunities = sorted(opportunities,
-                key=lambda x: x.get('priority_score', 5),
-                reverse=True)[:3]
-            
-            for s in top_strengths:
-                for o in top_opportunities:
-                    strategy = {
-                        'strategy': f"Tận dụng '{s.get('topic', '')}' để nắm bắt '{o.get('topic', '')}'",
-                        'strength_used': s.get('topic', ''),
-                        'opportunity_captured': o.get('topic', ''),
-                        'priority': 'High' if s.get('impact') == 'High' and o.get('priority_score', 0) > 7 else 'Medium'
-                    }
-                    if len(tows['SO_Strategies']) < 5:
-                        tows['SO_Strategies'].append(strategy)
+        so_strategies = tows['SO_Strategies']
+        for s in top_strengths:
+            if len(so_strategies) >= 5:
+                break
+            for o in top_opportunities:
+                if len(so_strategies) >= 5:
+                    break
+                so_strategies.append({
+                    'strategy': f"Tận dụng '{s.get('topic', '')}' để nắm bắt '{o.get('topic', '')}'",
+                    'strength_used': s.get('topic', ''),
+                    'opportunity_captured': o.get('topic', ''),
+                    'priority': 'High' if s.get('impact') == 'High' and o.get('priority_score', 0) > 7 else 'Medium'
+                })
         
         # Generate WO Strategies (Turnaround strategies)
-        if weaknesses and opportunities:
-            top_weaknesses = sorted(weaknesses,
-                key=lambda x: self.IMPACT_SCORES.get(x.get('impact', 'Medium'), 5),
-                reverse=True)[:3]
-            
-            for w in top_weaknesses:
-                for o in top_opportunities if 'top_opportunities' in dir() else opportunities[:3]:
-                    strategy = {
-                        'strategy': f"Khắc phục '{w.get('topic', '')}' bằng cách tận dụng '{o.get('topic', '')}'",
-                        'weakness_addressed': w.get('topic', ''),
-                        'opportunity_used': o.get('topic', ''),
-                        'priority': 'High' if w.get('impact') == 'High' else 'Medium'
-                    }
-                    if len(tows['WO_Strategies']) < 5:
-                        tows['WO_Strategies'].append(strategy)
+        wo_strategies = tows['WO_Strategies']
+        for w in top_weaknesses:
+            if len(wo_strategies) >= 5:
+                break
+            for o in top_opportunities:
+                if len(wo_strategies) >= 5:
+                    break
+                wo_strategies.append({
+                    'strategy': f"Khắc phục '{w.get('topic', '')}' bằng cách tận dụng '{o.get('topic', '')}'",
+                    'weakness_addressed': w.get('topic', ''),
+                    'opportunity_used': o.get('topic', ''),
+                    'priority': 'High' if w.get('impact') == 'High' else 'Medium'
+                })
         
         # Generate ST Strategies (Diversification strategies)
-        if strengths and threats:
-            top_threats = sorted(threats,
-                key=lambda x: self.RISK_SCORES.get(x.get('risk_level', 'Medium'), 5),
-                reverse=True)[:3]
-            
-            for s in top_strengths if 'top_strengths' in dir() else strengths[:3]:
-                for t in top_threats:
-                    strategy = {
-                        'strategy': f"Sử dụng '{s.get('topic', '')}' để đối phó '{t.get('topic', '')}'",
-                        'strength_used': s.get('topic', ''),
-                        'threat_countered': t.get('topic', ''),
-                        'priority': 'High' if t.get('risk_level') == 'High' else 'Medium'
-                    }
-                    if len(tows['ST_Strategies']) < 5:
-                        tows['ST_Strategies'].append(strategy)
+        st_strategies = tows['ST_Strategies']
+        for s in top_strengths:
+            if len(st_strategies) >= 5:
+                break
+            for t in top_threats:
+                if len(st_strategies) >= 5:
+                    break
+                st_strategies.append({
+                    'strategy': f"Sử dụng '{s.get('topic', '')}' để đối phó '{t.get('topic', '')}'",
+                    'strength_used': s.get('topic', ''),
+                    'threat_countered': t.get('topic', ''),
+                    'priority': 'High' if t.get('risk_level') == 'High' else 'Medium'
+                })
         
         # Generate WT Strategies (Defensive strategies)
-        if weaknesses and threats:
-            for w in top_weaknesses if 'top_weaknesses' in dir() else weaknesses[:3]:
-                for t in top_threats if 'top_threats' in dir() else threats[:3]:
-                    strategy = {
-                        'strategy': f"Giảm thiểu '{w.get('topic', '')}' để tránh bị ảnh hưởng bởi '{t.get('topic', '')}'",
-                        'weakness_addressed': w.get('topic', ''),
-                        'threat_mitigated': t.get('topic', ''),
-                        'priority': 'High' if w.get('impact') == 'High' and t.get('risk_level') == 'High' else 'Medium'
-                    }
-                    if len(tows['WT_Strategies']) < 5:
-                        tows['WT_Strategies'].append(strategy)
+        wt_strategies = tows['WT_Strategies']
+        for w in top_weaknesses:
+            if len(wt_strategies) >= 5:
+                break
+            for t in top_threats:
+                if len(wt_strategies) >= 5:
+                    break
+                wt_strategies.append({
+                    'strategy': f"Giảm thiểu '{w.get('topic', '')}' để tránh bị ảnh hưởng bởi '{t.get('topic', '')}'",
+                    'weakness_addressed': w.get('topic', ''),
+                    'threat_mitigated': t.get('topic', ''),
+                    'priority': 'High' if w.get('impact') == 'High' and t.get('risk_level') == 'High' else 'Medium'
+                })
         
         return tows
     
@@ -203,19 +311,6 @@ class StrategicAnalyzer:
         # Define timeline phases
         timelines = ['Q1 2026', 'Q2 2026', 'Q3 2026', 'Q4 2026']
         
-        # Define role assignments based on action type
-        role_mapping = {
-            'quality': 'Operations Manager',
-            'service': 'Customer Service Manager', 
-            'marketing': 'Marketing Manager',
-            'price': 'Finance Manager',
-            'product': 'Product Manager',
-            'staff': 'HR Manager',
-            'digital': 'IT Manager',
-            'brand': 'Marketing Manager',
-            'default': 'General Manager'
-        }
-        
         # Generate actions from high-impact Strengths (leverage)
         for item in swot.get('Strengths', []):
             if item.get('impact') == 'High':
@@ -224,7 +319,7 @@ class StrategicAnalyzer:
                     'type': 'Leverage Strength',
                     'priority': priority,
                     'timeline': timelines[min(priority - 1, 3)],
-                    'owner_role': self._get_owner_role(item.get('topic', ''), role_mapping),
+                    'owner_role': self._get_owner_role(item.get('topic', '')),
                     'kpis': item.get('kpi_metrics', ['Customer satisfaction score', 'Market share']),
                     'estimated_investment': 'Medium',
                     'expected_outcome': item.get('leverage_strategy', 'Tận dụng điểm mạnh để tăng trưởng'),
@@ -243,7 +338,7 @@ class StrategicAnalyzer:
                     'type': 'Address Weakness',
                     'priority': priority,
                     'timeline': timelines[min(priority - 1, 3)],
-                    'owner_role': self._get_owner_role(item.get('topic', ''), role_mapping),
+                    'owner_role': self._get_owner_role(item.get('topic', '')),
                     'kpis': ['Improvement rate', 'Customer feedback score'],
                     'estimated_investment': item.get('improvement_cost', 'Medium'),
                     'expected_outcome': item.get('mitigation_plan', 'Khắc phục điểm yếu'),
@@ -263,7 +358,7 @@ class StrategicAnalyzer:
                     'type': 'Capture Opportunity',
                     'priority': priority,
                     'timeline': timelines[min(priority - 1, 3)],
-                    'owner_role': self._get_owner_role(item.get('topic', ''), role_mapping),
+                    'owner_role': self._get_owner_role(item.get('topic', '')),
                     'kpis': ['New revenue', 'Market penetration'],
                     'estimated_investment': item.get('required_investment', 'Medium'),
                     'expected_outcome': item.get('action_idea', 'Tận dụng cơ hội thị trường'),
@@ -283,7 +378,7 @@ class StrategicAnalyzer:
                     'type': 'Mitigate Threat',
                     'priority': priority,
                     'timeline': timelines[0],  # Urgent
-                    'owner_role': self._get_owner_role(item.get('topic', ''), role_mapping),
+                    'owner_role': self._get_owner_role(item.get('topic', '')),
                     'kpis': ['Risk reduction rate', 'Incident count'],
                     'estimated_investment': 'Medium',
                     'expected_outcome': item.get('contingency_plan', 'Giảm thiểu rủi ro'),
@@ -295,19 +390,19 @@ class StrategicAnalyzer:
                 priority += 1
         
         # Sort by priority
-        actions.sort(key=lambda x: x['priority'])
+        actions.sort(key=itemgetter('priority'))
         
         return actions[:20]  # Limit to top 20 actions
     
-    def _get_owner_role(self, topic: str, role_mapping: Dict[str, str]) -> str:
-        """Determine owner role based on topic keywords"""
+    def _get_owner_role(self, topic: str) -> str:
+        """Determine owner role based on topic keywords (first keyword in table order wins)"""
         topic_lower = topic.lower()
         
-        for keyword, role in role_mapping.items():
+        for keyword, role in self.ROLE_KEYWORDS:
             if keyword in topic_lower:
                 return role
         
-        return role_mapping['default']
+        return self.DEFAULT_OWNER_ROLE
     
     def assess_risks(self, threats: List[Dict]) -> List[Dict]:
         """
@@ -319,44 +414,37 @@ class StrategicAnalyzer:
         Returns:
             List of threats with risk scores and recommendations
         """
-        assessed_risks = []
+        if not threats:
+            return []
         
-        for threat in threats:
-            probability = threat.get('probability', 'Medium')
-            severity = threat.get('severity', threat.get('risk_level', 'Medium'))
-            
-            prob_score = self.RISK_SCORES.get(probability, 5)
-            sev_score = self.RISK_SCORES.get(severity, 5)
-            
-            # Calculate composite risk score
-            risk_score = (prob_score * sev_score) / 10  # Scale to 0-8.1
-            
-            # Determine risk category
-            if risk_score >= 6:
-                risk_category = 'Critical'
-                recommendation = 'Cần hành động ngay lập tức, ưu tiên cao nhất'
-            elif risk_score >= 4:
-                risk_category = 'High'
-                recommendation = 'Cần lập kế hoạch ứng phó trong vòng 30 ngày'
-            elif risk_score >= 2:
-                risk_category = 'Medium'
-                recommendation = 'Theo dõi và chuẩn bị phương án dự phòng'
-            else:
-                risk_category = 'Low'
-                recommendation = 'Theo dõi định kỳ, không cần hành động ngay'
-            
-            assessed_risk = {
-                **threat,
-                'probability_score': prob_score,
-                'severity_score': sev_score,
-                'composite_risk_score': round(risk_score, 2),
+        prob_scores = np.fromiter(
+            (self.RISK_SCORES.get(t.get('probability', 'Medium'), 5) for t in threats),
+            dtype=np.int64, count=len(threats)
+        )
+        sev_scores = np.fromiter(
+            (self.RISK_SCORES.get(t.get('severity', t.get('risk_level', 'Medium')), 5) for t in threats),
+            dtype=np.int64, count=len(threats)
+        )
+        
+        # Calculate composite risk scores
+        risk_scores = (prob_scores * sev_scores) / 10  # Scale to 0-8.1
+        
+        # Determine risk category: [<2, 2-4, 4-6, >=6]
+        tiers = np.digitize(risk_scores, self.RISK_TIER_BOUNDS)
+        composite_scores = [round(score, 2) for score in risk_scores.tolist()]
+        
+        assessed_risks = []
+        # Sort by risk score descending (stable, same order as list.sort(reverse=True))
+        for i in np.argsort(-np.array(composite_scores), kind='stable').tolist():
+            risk_category, recommendation = self.RISK_TIERS[tiers[i]]
+            assessed_risks.append({
+                **threats[i],
+                'probability_score': int(prob_scores[i]),
+                'severity_score': int(sev_scores[i]),
+                'composite_risk_score': composite_scores[i],
                 'risk_category': risk_category,
                 'recommendation': recommendation
-            }
-            assessed_risks.append(assessed_risk)
-        
-        # Sort by risk score descending
-        assessed_risks.sort(key=lambda x: x['composite_risk_score'], reverse=True)
+            })
         
         return assessed_risks
     
@@ -371,65 +459,39 @@ class StrategicAnalyzer:
         Returns:
             Dict with competitive scores and analysis
         """
+        swot = my_shop_data.get('SWOT_Analysis', {})
+        return self._compute_positioning(swot)
+    
+    def _compute_positioning(self, swot: Dict[str, Any]) -> Dict:
+        """Compute competitive positioning scores from SWOT_Analysis items"""
         # Define dimensions for competitive analysis
         dimensions = ['quality', 'price', 'service', 'location', 'brand', 'innovation']
         
         my_scores = {}
-        competitor_scores = {}
         
-        swot = my_shop_data.get('SWOT_Analysis', {})
         strengths = swot.get('Strengths', [])
         weaknesses = swot.get('Weaknesses', [])
         
-        # Expanded keywords for better detection
-        # Expanded keywords (English + Vietnamese) for better detection
-        keywords = {
-            'quality': ['quality', 'taste', 'fresh', 'delicious', 'premium', 'standard',
-                       'chất lượng', 'ngon', 'vị', 'tươi', 'menu', 'đồ uống', 'bánh', 'sản phẩm', 'đậm đà'],
-            'price': ['price', 'cost', 'expensive', 'cheap', 'affordable', 'value', 'money',
-                     'giá', 'chi phí', 'đắt', 'rẻ', 'hợp lý', 'tiền', 'ví', 'khuyến mãi'],
-            'service': ['service', 'staff', 'friendly', 'slow', 'fast', 'attitude',
-                       'phục vụ', 'nhân viên', 'thái độ', 'chậm', 'nhanh', 'thân thiện', 'dịch vụ', 'order', 'nhiệt tình'],
-            'location': ['location', 'place', 'parking', 'space', 'view', 'center',
-                        'vị trí', 'không gian', 'chỗ ngồi', 'view', 'đẹp', 'thoáng', 'gửi xe', 'bãi xe', 'trang trí', 'decor'],
-            'brand': ['brand', 'reputation', 'image', 'famous', 'popular', 'known', 'marketing', 'awareness',
-                     'thương hiệu', 'nổi tiếng', 'uy tín', 'quen thuộc', 'hình ảnh', 'tin dùng'],
-            'innovation': ['innovation', 'creative', 'new', 'unique', 'technology', 'app', 'digital',
-                          'mới lạ', 'sáng tạo', 'app', 'công nghệ', 'độc đáo', 'khác biệt', 'trend', 'xu hướng']
-        }
-
         # Calculate scores based on SWOT items
+        # Each item is scanned once; its matched dimensions are then updated directly
+        strength_scores = dict.fromkeys(dimensions, 5)  # Start with neutral baseline
+        weakness_penalties = dict.fromkeys(dimensions, 0)
+        
+        # Check strengths: boost score based on impact
+        for s in strengths:
+            impact_boost = self.STRENGTH_BOOST.get(s.get('impact', 'Medium'), 2)
+            for dim in _matched_dimensions(_item_text(s)):
+                strength_scores[dim] = max(strength_scores[dim], 5 + impact_boost)
+        
+        # Check weaknesses: penalize score based on impact
+        for w in weaknesses:
+            penalty = self.WEAKNESS_PENALTY.get(w.get('impact', 'Medium'), 2)
+            for dim in _matched_dimensions(_item_text(w)):
+                weakness_penalties[dim] = max(weakness_penalties[dim], penalty)
+        
         for dim in dimensions:
-            dim_lower = dim.lower()
-            dim_keywords = keywords.get(dim_lower, [dim_lower])
-            
-            # Start with neutral baseline
-            strength_score = 5
-            
-            # Check strengths for this dimension
-            for s in strengths:
-                text = (s.get('topic', '') + ' ' + s.get('description', '')).lower()
-                if any(k in text for k in dim_keywords):
-                    # Boost score based on impact
-                    impact_boost = {
-                        'High': 4,      # 5 + 4 = 9 (Excellent)
-                        'Medium': 2,    # 5 + 2 = 7 (Good)
-                        'Low': 1        # 5 + 1 = 6 (Above Avg)
-                    }.get(s.get('impact', 'Medium'), 2)
-                    strength_score = max(strength_score, 5 + impact_boost)
-            
-            # Check weaknesses for this dimension
-            weakness_penalty = 0
-            for w in weaknesses:
-                text = (w.get('topic', '') + ' ' + w.get('description', '')).lower()
-                if any(k in text for k in dim_keywords):
-                    # Penalize score based on impact
-                    penalty = {
-                        'High': 3,      # 5 - 3 = 2 (Poor)
-                        'Medium': 2,    # 5 - 2 = 3 (Below Avg)
-                        'Low': 1        # 5 - 1 = 4 (Slightly Below)
-                    }.get(w.get('impact', 'Medium'), 2)
-                    weakness_penalty = max(weakness_penalty, penalty)
+            strength_score = strength_scores[dim]
+            weakness_penalty = weakness_penalties[dim]
             
             # Final My Score: Baseline + Boost - Penalty
             # Use max/min to keep within 1-10 range logic effectively
@@ -447,63 +509,73 @@ class StrategicAnalyzer:
         threats = swot.get('Threats', [])
         opportunities = swot.get('Opportunities', [])
         
-        for dim in dimensions:
-            dim_lower = dim.lower()
-            dim_keywords = keywords.get(dim_lower, [dim_lower])
-            
-            comp_score = 5  # Start with neutral baseline
+        competitor_scores = dict.fromkeys(dimensions, 5)  # Start with neutral baseline
+        
+        # Threats indicate competitor strengths
+        for t in threats:
+            text = _item_text(t)
+            risk_boost = self.THREAT_BOOST.get(t.get('risk_level', 'Medium'), 2)
+            matched = _matched_dimensions(text)
             
-            # Threats indicate competitor strengths
-            for t in threats:
-                text = (t.get('topic', '') + ' ' + t.get('description', '')).lower()
-                
-                # Special check for 'Big Competitor' markers in threats -> implies strong competitor brand
-                if dim == 'brand' and any(x in text for x in ['big', 'major', 'chain', 'franchise', 'giant', 'leader']):
-                    comp_score = max(comp_score, 9)
-                
-                elif any(k in text for k in dim_keywords):
-                    risk_boost = {
-                        'High': 3,      # 5 + 3 = 8 (Strong Competitor)
-                        'Medium': 2,    # 5 + 2 = 7 (Good Competitor)
-                        'Low': 1        # 5 + 1 = 6 (Above Avg)
-                    }.get(t.get('risk_level', 'Medium'), 2)
-                    comp_score = max(comp_score, 5 + risk_boost)
+            for dim in matched:
+                if dim != 'brand':
+                    competitor_scores[dim] = max(competitor_scores[dim], 5 + risk_boost)
             
-            # Opportunities may indicate competitor weaknesses (market gaps)
-            for o in opportunities:
-                text = (o.get('topic', '') + ' ' + o.get('description', '')).lower()
-                if any(k in text for k in dim_keywords):
-                    # Reduce competitor score if there's an opportunity here
-                    # e.g. "Competitors ignore X" or "Gap in X"
-                    gap_deduction = {
-                        'High': 2,    # 5 - 2 = 3 (Weak Competitor)
-                        'Medium': 1,  # 5 - 1 = 4 (Below Avg)
-                    }.get(o.get('priority', 'Medium') if 'priority' in o else 'Medium', 1)
-                    
-                    # Apply deduction only if we haven't already identified it as a strength via threats
-                    if comp_score == 5:
-                         comp_score = max(1, 5 - gap_deduction)
-                    
-            competitor_scores[dim] = comp_score
-
+            # Special check for 'Big Competitor' markers in threats -> implies strong competitor brand
+            if self.BIG_COMPETITOR_PATTERN.search(text):
+                competitor_scores['brand'] = max(competitor_scores['brand'], 9)
+            elif 'brand' in matched:
+                competitor_scores['brand'] = max(competitor_scores['brand'], 5 + risk_boost)
+        
+        # Opportunities may indicate competitor weaknesses (market gaps)
+        for o in opportunities:
+            # Reduce competitor score if there's an opportunity here
+            # e.g. "Competitors ignore X" or "Gap in X"
+            gap_deduction = self.GAP_DEDUCTION.get(o.get('priority', 'Medium') if 'priority' in o else 'Medium', 1)
+            for dim in _matched_dimensions(_item_text(o)):
+                # Apply deduction only if we haven't already identified it as a strength via threats
+                if competitor_scores[dim] == 5:
+                    competitor_scores[dim] = max(1, 5 - gap_deduction)
         
         # Calculate overall scores
-        my_overall = sum(my_scores.values()) / len(dimensions)
-        comp_overall = sum(competitor_scores.values()) / len(dimensions)
+        summary = _summarize_scores(my_scores, competitor_scores, dimensions)
         
         return {
             'my_scores': my_scores,
             'competitor_scores': competitor_scores,
-            'my_overall': round(my_overall, 1),
-            'competitor_overall': round(comp_overall, 1),
+            'my_overall': summary['my_overall'],
+            'competitor_overall': summary['competitor_overall'],
             'dimensions': dimensions,
-            'competitive_advantage': my_overall > comp_overall,
-            'advantage_gaps': {
-                dim: my_scores[dim] - competitor_scores[dim] 
-                for dim in dimensions
-            }
+            'competitive_advantage': summary['competitive_advantage'],
+            'advantage_gaps': summary['advantage_gaps']
         }
 
+def _summarize_scores(my_scores: Dict[str, float], competitor_scores: Dict[str, float],
+                      dimensions: List[str]) -> Dict[str, Any]:
+    """
+    Overall scores, advantage flag and per-dimension gaps as vector ops
+    
+    Args:
+        my_scores: Score per dimension for my shop
+        competitor_scores: Score per dimension for competitor
+        dimensions: Dimensions to aggregate over
+    
+    Returns:
+        Dict with my_overall, competitor_overall, competitive_advantage, advantage_gaps
+    """
+    my_arr = np.array([my_scores[dim] for dim in dimensions])
+    comp_arr = np.array([competitor_scores[dim] for dim in dimensions])
+    
+    my_overall = float(my_arr.sum()) / len(dimensions)
+    comp_overall = float(comp_arr.sum()) / len(dimensions)
+    
+    return {
+        'my_overall': round(my_overall, 1),
+        'competitor_overall': round(comp_overall, 1),
+        'competitive_advantage': my_overall > comp_overall,
+        'advantage_gaps': dict(zip(dimensions, (my_arr - comp_arr).tolist()))
+    }
+
 
 def enrich_swot_with_scores(swot_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -520,12 +592,24 @@ def enrich_swot_with_scores(swot_data: Dict[str, Any]) -> Dict[str, Any]:
     
     swot = enriched.get('SWOT_Analysis', {})
     
+    # Flatten all items once as (estimator, item): category dispatch happens per category, not per item
+    scored_items = list(itertools.chain.from_iterable(
+        ((score_fn, item) for item in swot.get(category, []))
+        for category, score_fn in analyzer._score_fns.items()
+    ))
+    
     # Add priority scores to each category
-    for category in ['Strengths', 'Weaknesses', 'Opportunities', 'Threats']:
-        items = swot.get(category, [])
-        for item in items:
-            if 'priority_score' not in item:
-                item['priority_score'] = analyzer.calculate_priority_score(item, category)
+    # (weighted sum for all unscored items computed in one vectorized pass)
+    pending = [(score_fn, item) for score_fn, item in scored_items if 'priority_score' not in item]
+    if pending:
+        components = np.array(
+            [(analyzer._impact_score(item), *score_fn(item)) for score_fn, item in pending],
+            dtype=np.float64
+        )
+        scores = components[:, 0] * analyzer._wi + components[:, 1] * analyzer._wf + components[:, 2] * analyzer._wu
+        scores = np.minimum(10, np.maximum(0, scores))
+        for (_, item), score in zip(pending, scores.tolist()):
+            item['priority_score'] = round(score, 1)
     
     # Generate TOWS Matrix
     enriched['TOWS_Matrix'] = analyzer.generate_tows_matrix(enriched)
@@ -550,15 +634,11 @@ def enrich_swot_with_scores(swot_data: Dict[str, Any]) -> Dict[str, Any]:
             calculated_competitive['competitor_scores'].update(ai_competitive['competitor_scores'])
             
         # Re-calculate averages
-        avg_my = sum(calculated_competitive['my_scores'].values()) / 6
-        avg_comp = sum(calculated_competitive['competitor_scores'].values()) / 6
-        calculated_competitive['my_overall'] = round(avg_my, 1)
-        calculated_competitive['competitor_overall'] = round(avg_comp, 1)
-        calculated_competitive['competitive_advantage'] = avg_my > avg_comp
-        calculated_competitive['advantage_gaps'] = {
-            dim: calculated_competitive['my_scores'][dim] - calculated_competitive['competitor_scores'][dim]
-            for dim in calculated_competitive['dimensions']
-        }
+        calculated_competitive.update(_summarize_scores(
+            calculated_competitive['my_scores'],
+            calculated_competitive['competitor_scores'],
+            calculated_competitive['dimensions']
+        ))
     
     enriched['Competitive_Analysis'] = calculated_competitive
     
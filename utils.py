@@ -1,12 +1,489 @@
 """
 Utility Functions - Xử lý dữ liệu và visualization
 """
+import csv
+import functools
+import io
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from typing import List, Dict, Any, Tuple
+import re
+from collections import Counter
+from itertools import chain
+from typing import List, Dict, Any, Optional, Tuple
 import streamlit as st
 
+# Kiểu chuỗi Arrow (pyarrow đi kèm streamlit) cho các phép .str trên cột review/source
+try:
+    _ARROW_STRING_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    _ARROW_STRING_DTYPE = None
+
+# Thử dùng engine calamine (python-calamine, pandas >= 2.2) để đọc Excel nhanh hơn
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+
+def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+    """Biên dịch danh sách từ khóa thành một regex: .search() ~ any(k in text for k in keywords)"""
+    return re.compile('|'.join(re.escape(k) for k in keywords))
+
+
+# ========== TỪ KHÓA NHẬN DIỆN CỘT (biên dịch một lần khi import) ==========
+
+# Từ khóa tên cột review (Bước 1)
+_REVIEW_COL_RE = _keyword_pattern([
+    # Tiếng Anh
+    'review', 'reviews', 'comment', 'comments', 'content', 'text', 'feedback',
+    'comment_text', 'review_text', 'review_content', 'comment_content',
+    'description', 'desc', 'note', 'notes', 'remark', 'remarks',
+    'opinion', 'opinions', 'thought', 'thoughts', 'experience', 'experiences',
+    'rating_text', 'rating_comment', 'user_comment', 'customer_comment',
+    'review_detail', 'comment_detail', 'detail', 'details',
+    'message', 'messages', 'input', 'response', 'responses',
+    # Tiếng Việt
+    'đánh giá', 'đánh giá khách hàng', 'nhận xét', 'nội dung', 'mô tả',
+    'bình luận', 'phản hồi', 'ý kiến', 'cảm nhận', 'trải nghiệm',
+    'chi tiết', 'ghi chú', 'lời nhận xét', 'lời đánh giá',
+    # Từ khóa chung
+    'text', 'txt', 'content', 'data', 'info', 'information'
+])
+
+# Tên cột review rõ ràng (ưu tiên làm cột chính / không bị phạt điểm)
+_EXPLICIT_REVIEW_COL_RE = _keyword_pattern(['review', 'comment', 'feedback', 'đánh giá', 'nhận xét'])
+
+# Cột ID, code, số hoặc Item/Menu - không phải review (Bước 2)
+_NON_REVIEW_COL_RE = _keyword_pattern([
+    'id', 'code', 'number', 'num', 'no', 'stt', 'index', 'item', 'menu', 'product', 'món', 'tên', 'category', 'sản phẩm'
+])
+
+# Cột có thể nhầm với source theo tên (Bước 3)
+_SOURCE_NAME_EXCLUDED_RE = _keyword_pattern(['link', 'url', 'review', 'text', 'address', 'name', 'description', 'content'])
+
+# Cột không phải source khi phân tích giá trị (Bước 4)
+_SOURCE_VALUE_EXCLUDED_RE = _keyword_pattern([
+    'review', 'text', 'desc', 'content', 'comment',
+    'address', 'name', 'link', 'url', 'item', 'menu',
+    'price', 'rating', 'date', 'user', 'customer'
+])
+
+# Nhận diện file Menu/Bảng giá (Bước 5)
+_MENU_ITEM_COL_RE = _keyword_pattern(['product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm'])
+_MENU_PRICE_COL_RE = _keyword_pattern(['price', 'cost', 'amount', 'giá', 'đơn giá', 'tiền'])
+_MENU_ID_COL_RE = _keyword_pattern(['code', 'id', 'mã', 'stt', 'no.', 'order'])
+
+# Nhận diện file Menu khi không còn review hợp lệ sau khi làm sạch (danh sách mở rộng)
+_FALLBACK_ITEM_COL_RE = _keyword_pattern(['product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'ten mon', 'san pham'])
+_FALLBACK_PRICE_COL_RE = _keyword_pattern(['price', 'cost', 'amount', 'giá', 'đơn giá', 'tiền', 'gia', 'don gia'])
+
+# Từ khóa đối thủ / quán mình trong tên file (Bước 6 - Phương pháp 1)
+_COMPETITOR_FILE_RE = _keyword_pattern([
+    'competitor', 'đối thủ', 'rival', 'competitors',
+    # Thương hiệu cà phê
+    'starbucks', 'phuc long', 'phuclong', 'katinat', 'highlands', 'highland',
+    'trung nguyen', 'trungnguyen', 'the coffee house', 'coffee house',
+    'cong ca phe', 'congcaphe', 'passio', 'gong cha', 'gongcha',
+    # Nền tảng
+    'shopee', 'lazada', 'grab', 'now', 'baemin', 'gojek', 'go food',
+    # Từ khóa khác
+    'other', 'others', 'competition', 'market'
+])
+_MY_SHOP_FILE_RE = _keyword_pattern([
+    'my_shop', 'myshop', 'của mình', 'cua minh', 'my store', 'mystore',
+    'our shop', 'ourshop', 'our store', 'ourstore', 'my_', 'my-',
+    'own', 'self', 'internal', 'nội bộ', 'noi bo'
+])
+
+# Từ khóa tên file dùng khi hiển thị nguồn đã tự phát hiện (danh sách rút gọn)
+_COMPETITOR_FILE_DISPLAY_RE = _keyword_pattern([
+    'competitor', 'đối thủ', 'starbucks', 'phuc long', 'katinat',
+    'highlands', 'trung nguyen', 'shopee', 'lazada', 'grab',
+    'now', 'baemin', 'gojek', 'competitors', 'rival'
+])
+_MY_SHOP_FILE_DISPLAY_RE = _keyword_pattern(['my_shop', 'của mình', 'my store', 'our shop', 'our store', 'my_'])
+
+# Cột bổ sung (Bước 7) - MỞ RỘNG từ khóa
+_PRICE_COL_RE = _keyword_pattern([
+    'price', 'giá', 'cost', 'chi phí', 'amount', 'số tiền', 'money', 'giá cả',
+    'gia', 'don gia', 'đơn giá', 'gia_ban', 'gia ban', 'price_range', 'pricing',
+    'giá bán', 'giá trị', 'value', 'cost_price', 'selling_price', 'unit_price',
+    'giá tiền', 'tien', 'tiền', 'vnd', 'dong', 'đồng', 'usd', 'currency',
+    'gia_hien_thi', 'gia hien thi', 'display_price', 'final_price', 'total_price'
+])
+_RATING_COL_RE = _keyword_pattern([
+    'rating', 'điểm', 'score', 'star', 'sao', 'đánh giá số', 'rate',
+    'diem', 'danh gia', 'stars', 'rating_score', 'review_score', 'overall_rating',
+    'customer_rating', 'user_rating', 'quality_score', 'satisfaction', 'mức độ hài lòng',
+    'điểm số', 'diem so', 'đánh giá', 'danh gia', 'vote', 'votes', 'likes'
+])
+_MENU_COL_RE = _keyword_pattern([
+    'menu', 'product', 'sản phẩm', 'item', 'món', 'dish', 'drink', 'đồ uống',
+    'food', 'thức ăn', 'san pham', 'ten mon', 'tên món', 'product_name',
+    'item_name', 'menu_item', 'dish_name', 'product_title', 'item_title',
+    'tên sản phẩm', 'ten san pham', 'món ăn', 'mon an', 'đồ ăn', 'do an',
+    'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'brand', 'thương hiệu'
+])
+_MENU_COL_EXCLUDED_RE = _keyword_pattern(['code', 'id', 'mã', 'stt', 'no.', 'order', '_no', '_id'])
+_DATE_COL_RE = _keyword_pattern([
+    'date', 'ngày', 'time', 'thời gian', 'created', 'updated', 'timestamp',
+    'ngay', 'thoi gian', 'created_at', 'updated_at', 'created_date', 'updated_date',
+    'review_date', 'comment_date', 'post_date', 'publish_date', 'datetime', 'date_time',
+    'ngày đánh giá', 'ngay danh gia', 'ngày tạo', 'ngay tao', 'thời điểm', 'thoi diem'
+])
+_USER_COL_RE = _keyword_pattern([
+    'user', 'customer', 'khách hàng', 'name', 'tên', 'author', 'người đánh giá',
+    'khach hang', 'nguoi danh gia', 'reviewer', 'reviewer_name', 'customer_name',
+    'user_name', 'username', 'full_name', 'tên khách', 'ten khach', 'người dùng',
+    'nguoi dung', 'buyer', 'purchaser', 'client', 'visitor', 'guest'
+])
+_USER_COL_EXCLUDED_RE = _keyword_pattern(['restaurant', 'shop', 'store', 'address', 'location', 'link'])
+_LOCATION_COL_RE = _keyword_pattern([
+    'location', 'address', 'địa chỉ', 'dia chi', 'place', 'venue', 'vị trí', 'vi tri',
+    'city', 'thành phố', 'thanh pho', 'district', 'quận', 'quan', 'ward', 'phường', 'phuong',
+    'street', 'đường', 'duong', 'area', 'khu vực', 'khu vuc'
+])
+_QUANTITY_COL_RE = _keyword_pattern([
+    'quantity', 'qty', 'số lượng', 'so luong', 'amount', 'số', 'so', 'count',
+    'quantity_ordered', 'qty_ordered', 'units', 'số đơn', 'so don', 'volume'
+])
+_CATEGORY_COL_RE = _keyword_pattern([
+    'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'group', 'nhóm', 'nhom',
+    'classification', 'class', 'tag', 'tags', 'label', 'labels', 'genre', 'thể loại', 'the loai'
+])
+
+# Thứ tự ưu tiên các cột bổ sung: (tên trường, regex từ khóa, regex loại trừ)
+_ADDITIONAL_COL_PATTERNS = (
+    ('price', _PRICE_COL_RE, None),
+    ('rating', _RATING_COL_RE, None),
+    ('menu', _MENU_COL_RE, _MENU_COL_EXCLUDED_RE),
+    ('date', _DATE_COL_RE, None),
+    ('user', _USER_COL_RE, _USER_COL_EXCLUDED_RE),
+    ('location', _LOCATION_COL_RE, None),
+    ('quantity', _QUANTITY_COL_RE, None),
+    ('category', _CATEGORY_COL_RE, None),
+)
+
+# Cột bổ sung dạng số nguyên nhỏ được downcast sau khi làm sạch
+_DOWNCAST_INT_COLS = ('rating', 'quantity')
+
+# Từ khóa nhận diện cột bổ sung khi gửi cho AI (prepare_reviews_for_ai) - theo thứ tự ưu tiên
+_AI_PRICE_COL_RE = _keyword_pattern([
+    'price', 'cost', 'amount', 'giá', 'đơn giá', 'chi phí', 'tiền', 'gia', 'don gia', 'gia_ban',
+    'gia hien thi', 'gia_hien_thi', 'display_price', 'final_price', 'total_price', 'selling_price',
+    'unit_price', 'cost_price', 'price_range', 'pricing', 'giá bán', 'giá trị', 'value', 'vnd', 'dong'
+])
+_AI_MENU_COL_RE = _keyword_pattern([
+    'product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'food', 'drink', 'name', 'tên',
+    'ten mon', 'san pham', 'product_name', 'item_name', 'menu_item', 'dish_name', 'product_title',
+    'tên sản phẩm', 'ten san pham', 'món ăn', 'mon an', 'đồ ăn', 'do an', 'category', 'danh mục',
+    'type', 'loại', 'loai', 'brand', 'thương hiệu'
+])
+_AI_RATING_COL_RE = _keyword_pattern([
+    'rating', 'score', 'star', 'điểm', 'sao', 'đánh giá', 'danh gia', 'diem', 'stars', 'rating_score',
+    'review_score', 'overall_rating', 'customer_rating', 'user_rating', 'quality_score', 'satisfaction',
+    'điểm số', 'diem so', 'vote', 'votes', 'likes'
+])
+_AI_DATE_COL_RE = _keyword_pattern([
+    'date', 'time', 'ngày', 'giờ', 'thời gian', 'ngay', 'created_at', 'updated_at', 'created_date',
+    'updated_date', 'review_date', 'comment_date', 'post_date', 'publish_date', 'datetime', 'date_time',
+    'ngày đánh giá', 'ngay danh gia', 'ngày tạo', 'ngay tao', 'thời điểm', 'thoi diem'
+])
+_AI_USER_COL_RE = _keyword_pattern([
+    'user', 'customer', 'name', 'khách', 'người dùng', 'tên khách', 'khach hang', 'nguoi danh gia',
+    'reviewer', 'reviewer_name', 'customer_name', 'user_name', 'username', 'full_name', 'tên khách',
+    'ten khach', 'người dùng', 'nguoi dung', 'buyer', 'purchaser', 'client', 'visitor', 'guest'
+])
+_AI_LOCATION_COL_RE = _keyword_pattern([
+    'location', 'address', 'địa chỉ', 'dia chi', 'place', 'venue', 'vị trí', 'vi tri',
+    'city', 'thành phố', 'thanh pho', 'district', 'quận', 'quan', 'ward', 'phường', 'phuong'
+])
+_AI_QUANTITY_COL_RE = _keyword_pattern([
+    'quantity', 'qty', 'số lượng', 'so luong', 'amount', 'số', 'so', 'count',
+    'quantity_ordered', 'qty_ordered', 'units', 'số đơn', 'so don', 'volume'
+])
+_AI_CATEGORY_COL_RE = _keyword_pattern([
+    'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'group', 'nhóm', 'nhom',
+    'classification', 'class', 'tag', 'tags', 'label', 'labels', 'genre', 'thể loại', 'the loai'
+])
+_AI_COL_PATTERNS = (
+    ('price', _AI_PRICE_COL_RE),
+    ('menu', _AI_MENU_COL_RE),
+    ('rating', _AI_RATING_COL_RE),
+    ('date', _AI_DATE_COL_RE),
+    ('user', _AI_USER_COL_RE),
+    ('location', _AI_LOCATION_COL_RE),
+    ('quantity', _AI_QUANTITY_COL_RE),
+    ('category', _AI_CATEGORY_COL_RE)
+)
+
+# Dấu câu/ký tự không phải chữ-số: bỏ đi khi tạo khóa đa dạng để gộp các review gần trùng
+_REVIEW_NOISE_RE = re.compile(r'[\W_]+')
+
+# Từ khóa quan trọng (liên quan SWOT) cộng điểm ưu tiên khi chọn lọc review
+_IMPORTANT_KEYWORDS = (
+    'tốt', 'tuyệt', 'xuất sắc', 'tệ', 'kém', 'chậm', 'nhanh', 'đắt', 'rẻ', 'giá',
+    'nhân viên', 'phục vụ', 'dịch vụ', 'chất lượng', 'ngon', 'dở', 'sạch', 'bẩn',
+    'không gian', 'vị trí', 'thuận tiện', 'đông', 'vắng', 'yên tĩnh', 'ồn ào',
+    'đề xuất', 'khuyên', 'không nên', 'tránh', 'nên thử', 'quay lại', 'không quay lại',
+    'good', 'excellent', 'bad', 'poor', 'slow', 'fast', 'expensive', 'cheap', 'price',
+    'staff', 'service', 'quality', 'delicious', 'dirty', 'clean', 'space', 'location'
+)
+
+# ========== GIÁ TRỊ NHẬN DIỆN SOURCE (so khớp chính xác) ==========
+
+# Tên cột source khớp chính xác (Bước 3)
+_SOURCE_COL_NAMES = frozenset({'source', 'nguồn'})
+_SHOP_TYPE_COL_NAMES = frozenset({'shop_type', 'store_type'})
+_SHOP_TYPE_SOURCE_VALUES = frozenset({'MY_SHOP', 'COMPETITOR', 'MY SHOP', 'CỦA MÌNH', 'ĐỐI THỦ'})
+
+# Giá trị source chính xác khi phân tích nội dung cột (Bước 4)
+_EXACT_SOURCE_VALUES = frozenset({'MY_SHOP', 'COMPETITOR', 'MY SHOP', 'CỦA MÌNH', 'ĐỐI THỦ', 'COMPETITORS'})
+
+# Tên thương hiệu đối thủ trong nội dung các cột text (Bước 6 - Phương pháp 2)
+_COMPETITOR_BRAND_RE = _keyword_pattern([
+    'starbucks', 'phuc long', 'highlands', 'katinat',
+    'trung nguyen', 'coffee house', 'cong ca phe'
+])
+
+# Tên shop/brand cụ thể từ tên file (kiểm tra theo thứ tự)
+_SHOP_NAME_KEYWORDS = {
+    'starbucks': 'STARBUCKS',
+    'phuc long': 'PHUC_LONG',
+    'phuclong': 'PHUC_LONG',
+    'highlands': 'HIGHLANDS',
+    'highland': 'HIGHLANDS',
+    'katinat': 'KATINAT',
+    'trung nguyen': 'TRUNG_NGUYEN',
+    'trungnguyen': 'TRUNG_NGUYEN',
+    'coffee house': 'COFFEE_HOUSE',
+    'cong ca phe': 'CONG_CA_PHE',
+    'congcaphe': 'CONG_CA_PHE',
+    'passio': 'PASSIO',
+    'gong cha': 'GONG_CHA',
+    'gongcha': 'GONG_CHA'
+}
+_SHOP_NAME_RE = _keyword_pattern(list(_SHOP_NAME_KEYWORDS))
+
+# Hai giá trị source chuẩn (dùng làm categories cho cột source)
+_SOURCE_CATEGORIES = ['MY_SHOP', 'COMPETITOR']
+
+# Mapping các giá trị source phổ biến
+_SOURCE_MAPPING = {
+    'MY_SHOP': 'MY_SHOP',
+    'MY SHOP': 'MY_SHOP',
+    'CỦA MÌNH': 'MY_SHOP',
+    'CUA MINH': 'MY_SHOP',
+    'SHOP': 'MY_SHOP',
+    'STORE': 'MY_SHOP',
+    'BRAND': 'MY_SHOP',
+    'COMPETITOR': 'COMPETITOR',
+    'COMPETITORS': 'COMPETITOR',
+    'ĐỐI THỦ': 'COMPETITOR',
+    'DOI THU': 'COMPETITOR',
+    'COMPETITION': 'COMPETITOR',
+    'RIVAL': 'COMPETITOR'
+}
+
+
+# BOM -> encoding (kiểm tra trước khi thử decode utf-8)
+_BOM_ENCODINGS = (
+    (b'\xef\xbb\xbf', 'utf-8-sig'),
+    (b'\xff\xfe', 'utf-16'),
+    (b'\xfe\xff', 'utf-16'),
+)
+
+# Số byte đầu file dùng để nhận diện encoding
+_ENCODING_SAMPLE_SIZE = 65536
+
+# Dòng đầu tiên của file (kết thúc bằng \n, \r hoặc \r\n như khi đọc file)
+_FIRST_LINE_RE = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)?')
+
+
+# Số dòng đầu dùng để lấy mẫu giá trị unique của một cột
+_UNIQUE_SAMPLE_ROWS = 500
+
+# Số dòng đầu dùng để ước lượng tỷ lệ giá trị số của cột giá
+_NUMERIC_SAMPLE_ROWS = 500
+
+
+# ========== TRÍCH XUẤT GIÁ (extract_price_data) ==========
+
+# Từ khóa tên cột món/sản phẩm (gồm 'name', 'desc' để fallback khi cột 'Item' bị loại do là ID)
+_PRICE_ITEM_COL_RE = _keyword_pattern([
+    'product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'food', 'drink',
+    'name', 'tên', 'desc', 'mô tả', 'ten mon', 'san pham'
+])
+
+# Tên cột ID/mã bị loại khỏi ứng viên cột món
+_PRICE_ITEM_EXCLUDED_COL_RE = _keyword_pattern(['code', 'id', 'mã', 'stt', 'no.', 'order', '_no', '_id'])
+
+# Từ khóa tên cột giá
+_PRICE_CANDIDATE_COL_RE = _keyword_pattern([
+    'price', 'cost', 'amount', 'giá', 'đơn giá', 'chi phí', 'tiền', 'gia', 'don gia', 'gia_ban'
+])
+
+# Nhận diện cột pivot (giá trị source) là của mình / đối thủ (so khớp chuỗi con trên tên đã lowercase)
+_PIVOT_MY_SHOP_RE = _keyword_pattern(['my_shop', 'myshop', 'my shop', 'của mình', 'shop', 'store', 'me'])
+_PIVOT_NOT_MY_SHOP_RE = _keyword_pattern(['bạn', 'competitor', 'đối thủ', 'other'])
+_PIVOT_COMPETITOR_RE = _keyword_pattern(['competitor', 'đối thủ', 'thị trường', 'quán khác', 'other'])
+
+# Ký tự không phải chữ số (bỏ đi khi chuyển chuỗi giá sang số)
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+
+# Giá trị dạng ID (uuid, dãy số/hex dài) trong cột món -> cột không phải tên món
+_PRICE_ITEM_ID_VALUE_RE = re.compile(r'^[0-9a-fA-F\-]{10,}$')
+
+# Tên món chứa các từ khóa này thì ghi đè source (so khớp trên tên món đã lowercase)
+_PRICE_MYSHOP_ITEM_RE = re.compile(r'my_shop|myshop|của mình|my store|shop mình')
+_PRICE_COMPETITOR_ITEM_RE = re.compile(r'competitor|đối thủ|thị trường|quán khác')
+
+
+def _as_text(values: pd.Series) -> pd.Series:
+    """Ép cột về chuỗi (như astype(str)), lưu dạng Arrow nếu có để các phép .str chạy nhanh hơn"""
+    text = values.astype(str)
+    if _ARROW_STRING_DTYPE is not None:
+        text = text.astype(_ARROW_STRING_DTYPE)
+    return text
+
+
+def _upper_stripped(values: pd.Series) -> pd.Series:
+    """Chuẩn hóa giá trị: str, viết hoa, bỏ khoảng trắng hai đầu"""
+    return values.astype(str).str.upper().str.strip()
+
+
+def _lower_stripped(values: pd.Series) -> pd.Series:
+    """Chuẩn hóa giá trị: str, viết thường, bỏ khoảng trắng hai đầu"""
+    return values.astype(str).str.lower().str.strip()
+
+
+def _first_unique_values(values: pd.Series, limit: int, normalize):
+    """
+    Lấy `limit` giá trị khác nhau đầu tiên (theo thứ tự xuất hiện) của một cột
+    Chỉ quét _UNIQUE_SAMPLE_ROWS dòng đầu; quét cả cột khi mẫu chưa đủ giá trị
+    (kết quả giống normalize(values).unique()[:limit])
+    
+    Args:
+        values: Cột dữ liệu
+        limit: Số giá trị unique cần lấy
+        normalize: Hàm chuẩn hóa Series trước khi lấy unique
+    
+    Returns:
+        Mảng các giá trị unique
+    """
+    head_values = normalize(values.head(_UNIQUE_SAMPLE_ROWS)).unique()
+    if len(head_values) >= limit or len(values) <= _UNIQUE_SAMPLE_ROWS:
+        return head_values[:limit]
+    return normalize(values).unique()[:limit]
+
+
+def _sample_has_label(values: pd.Series, limit: int, labels: frozenset) -> bool:
+    """
+    Kiểm tra trong `limit` giá trị unique đầu tiên của cột (viết hoa, bỏ khoảng trắng)
+    có nhãn nào thuộc `labels` không
+    Nhãn xuất hiện trong các dòng mẫu đầu -> trả về ngay, không chuẩn hóa cả cột
+    
+    Args:
+        values: Cột dữ liệu
+        limit: Số giá trị unique đầu tiên được xét
+        labels: Tập nhãn source hợp lệ
+    
+    Returns:
+        True nếu tìm thấy nhãn
+    """
+    head_values = _upper_stripped(values.head(_UNIQUE_SAMPLE_ROWS)).unique()[:limit]
+    if not labels.isdisjoint(head_values):
+        return True
+    if len(head_values) >= limit or len(values) <= _UNIQUE_SAMPLE_ROWS:
+        return False
+    return not labels.isdisjoint(_upper_stripped(values).unique()[:limit])
+
+
+def _detect_csv_encoding(sample: bytes) -> str:
+    """
+    Nhận diện encoding của CSV từ một mẫu byte nhỏ ở đầu file
+    
+    Args:
+        sample: Các byte đầu file
+    
+    Returns:
+        Tên encoding: theo BOM nếu có, 'utf-8' nếu mẫu decode được, ngược lại 'latin-1'
+    """
+    for bom, encoding in _BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Mẫu có thể cắt ngang một ký tự nhiều byte ở cuối
+        if e.start < len(sample) - 3:
+            return 'latin-1'
+    return 'utf-8'
+
+
+def _read_csv_sniffed(uploaded_file, encoding: str) -> pd.DataFrame:
+    """
+    Đọc CSV với encoding cho trước, tự dò dấu phân cách
+    
+    Args:
+        uploaded_file: File object từ Streamlit uploader
+        encoding: Encoding dùng để đọc
+    
+    Returns:
+        DataFrame đọc được
+    """
+    # Dò dấu phân cách trên dòng đầu (giống sep=None của engine python) rồi đọc bằng engine C
+    uploaded_file.seek(0)  # Reset file pointer
+    sample = uploaded_file.read(_ENCODING_SAMPLE_SIZE).decode(encoding, errors='replace')
+    first_line = _FIRST_LINE_RE.match(sample).group(0)
+    uploaded_file.seek(0)
+    try:
+        sep = csv.Sniffer().sniff(first_line).delimiter
+    except csv.Error:
+        sep = None
+    if sep is not None:
+        df = pd.read_csv(uploaded_file, encoding=encoding, sep=sep)
+    else:
+        # Use separator sniffing
+        df = pd.read_csv(uploaded_file, encoding=encoding, sep=None, engine='python')
+    
+    # If sniffing returned 1 column, try fallback separators
+    if len(df.columns) == 1:
+         # Prioritize semicolon, then tab, then comma (explicitly)
+         for sep in [';', '\t', ',']:
+             try:
+                 uploaded_file.seek(0)
+                 df_temp = pd.read_csv(uploaded_file, encoding=encoding, sep=sep)
+                 if len(df_temp.columns) > 1:
+                     return df_temp
+             except:
+                 pass
+    return df
+
+
+def _read_excel_bytes(raw: bytes, file_extension: str) -> pd.DataFrame:
+    """
+    Đọc file Excel từ bytes, ưu tiên engine calamine nếu có
+    
+    Args:
+        raw: Nội dung file (bytes)
+        file_extension: 'xlsx' hoặc 'xls'
+    
+    Returns:
+        DataFrame của sheet đầu tiên
+    """
+    if HAS_CALAMINE:
+        try:
+            return pd.read_excel(io.BytesIO(raw), engine='calamine')
+        except Exception:
+            # pandas cũ chưa hỗ trợ engine calamine -> dùng engine mặc định
+            pass
+    # openpyxl (pandas tự mở workbook ở chế độ read_only); .xls dùng engine mặc định (xlrd)
+    return pd.read_excel(io.BytesIO(raw), engine='openpyxl' if file_extension == 'xlsx' else None)
+
 
 def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
     """
@@ -27,38 +504,58 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
         # Đọc file dựa trên extension
         file_extension = uploaded_file.name.split('.')[-1].lower()
         
-        # Thử nhiều encoding phổ biến
-        if file_extension == 'csv':
-            encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252', 'iso-8859-1', 'utf-16']
-            for encoding in encodings:
-                try:
-                    uploaded_file.seek(0)  # Reset file pointer
-                    # Use separator sniffing
-                    df = pd.read_csv(uploaded_file, encoding=encoding, sep=None, engine='python')
-                    
-                    # If sniffing returned 1 column, try fallback separators
-                    if len(df.columns) == 1:
-                         # Prioritize semicolon, then tab, then comma (explicitly)
-                         for sep in [';', '\t', ',']:
-                             try:
-                                 uploaded_file.seek(0)
-                                 df_temp = pd.read_csv(uploaded_file, encoding=encoding, sep=sep, engine='python')
-                                 if len(df_temp.columns) > 1:
-                                     df = df_temp
-                                     break
-                             except:
-                                 pass
-                    
-                    break
-                except UnicodeDecodeError:
-                    continue
-                except Exception:
-                     continue
+        # Lấy toàn bộ nội dung mà không phụ thuộc vị trí con trỏ hiện tại của buffer
+        # (Streamlit giữ lại cùng một buffer giữa các lần rerun)
+        if hasattr(uploaded_file, 'getvalue'):
+            raw = uploaded_file.getvalue()
+        else:
+            try:
+                uploaded_file.seek(0)
+            except Exception:
+                pass
+            raw = uploaded_file.read()
+    except Exception as e:
+        raise Exception(f"Lỗi khi đọc file: {str(e)}")
+    
+    # Phần xử lý nặng được cache theo nội dung file: rerun với cùng file không phải làm lại
+    df_clean, file_summary = _load_and_clean_bytes(raw, file_name, file_extension)
+    
+    # Lưu vào session state để app.py hiển thị
+    if file_summary is not None:
+        if 'file_summaries' not in st.session_state:
+            st.session_state['file_summaries'] = []
+        st.session_state['file_summaries'].append(file_summary)
+    
+    return df_clean
 
-            if df is None:
-                raise ValueError("Không thể đọc file CSV với các encoding phổ biến")
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _load_and_clean_bytes(raw: bytes, file_name: str, file_extension: str) -> Tuple[pd.DataFrame, Optional[Dict[str, Any]]]:
+    """
+    Đọc và làm sạch dữ liệu từ nội dung file (được cache bởi Streamlit)
+    
+    Args:
+        raw: Nội dung file (bytes)
+        file_name: Tên file (dùng để nhận diện source)
+        file_extension: Phần mở rộng của file ('csv', 'xlsx', 'xls')
+    
+    Returns:
+        Tuple (DataFrame đã được làm sạch, thông tin file để hiển thị hoặc None)
+    """
+    try:
+        if file_extension == 'csv':
+            # Nhận diện encoding từ một mẫu nhỏ rồi parse file đúng một lần,
+            # thay vì đọc lại toàn bộ file với từng encoding
+            encoding = _detect_csv_encoding(raw[:_ENCODING_SAMPLE_SIZE])
+            try:
+                df = _read_csv_sniffed(io.BytesIO(raw), encoding)
+            except UnicodeDecodeError:
+                # Phần sau của file không phải utf-8
+                df = _read_csv_sniffed(io.BytesIO(raw), 'latin-1')
+            except Exception as e:
+                raise ValueError(f"Không thể đọc file CSV: {str(e)}")
         elif file_extension in ['xlsx', 'xls']:
-            df = pd.read_excel(uploaded_file)
+            df = _read_excel_bytes(raw, file_extension)
         else:
             raise ValueError(f"Định dạng file không được hỗ trợ: {file_extension}")
         
@@ -74,79 +571,50 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
         column_mapping = {col.strip().lower(): col for col in original_columns}
         
         # Chuẩn hóa tên cột (chuyển về lowercase, bỏ khoảng trắng)
+        # Các bước sau dùng trực tiếp tên cột đã chuẩn hóa, không lower()/strip() lại
         df.columns = df.columns.str.strip().str.lower()
+        file_name_lower = (file_name or '').lower()
         
         # Tìm cột chứa review và source
-        review_cols = []  # Có thể có nhiều cột chứa review
         source_col = None
         
         # Bước 1: Tìm TẤT CẢ các cột có thể chứa review bằng từ khóa (mở rộng)
-        possible_review_names = [
-            # Tiếng Anh
-            'review', 'reviews', 'comment', 'comments', 'content', 'text', 'feedback',
-            'comment_text', 'review_text', 'review_content', 'comment_content',
-            'description', 'desc', 'note', 'notes', 'remark', 'remarks',
-            'opinion', 'opinions', 'thought', 'thoughts', 'experience', 'experiences',
-            'rating_text', 'rating_comment', 'user_comment', 'customer_comment',
-            'review_detail', 'comment_detail', 'detail', 'details',
-            'message', 'messages', 'input', 'response', 'responses',
-            # Tiếng Việt
-            'đánh giá', 'đánh giá khách hàng', 'nhận xét', 'nội dung', 'mô tả',
-            'bình luận', 'phản hồi', 'ý kiến', 'cảm nhận', 'trải nghiệm',
-            'chi tiết', 'ghi chú', 'lời nhận xét', 'lời đánh giá',
-            # Từ khóa chung
-            'text', 'txt', 'content', 'data', 'info', 'information'
-        ]
-        
-        for col in df.columns:
-            col_lower = col.lower().strip()
-            # Kiểm tra chính xác hoặc chứa từ khóa
-            if any(name in col_lower or col_lower == name for name in possible_review_names):
-                review_cols.append(col)
+        # (lọc danh sách cột bằng một mask str.contains, giữ thứ tự cột)
+        review_cols = df.columns[df.columns.str.contains(_REVIEW_COL_RE)].tolist()
         
         # Bước 2: Nếu không tìm thấy bằng từ khóa, phân tích tất cả cột text
         if not review_cols:
-            text_columns = []
-            text_scores = {}
+            # Chỉ xét cột text, ép kiểu str một lần và tính từng chỉ số cho tất cả cột
+            text_df = df.select_dtypes(include='object')
             
-            for col in df.columns:
-                if df[col].dtype == 'object':  # Chỉ xét cột text
-                    # Tính điểm dựa trên nhiều yếu tố
-                    col_lower = col.lower()
-                    score = 0
-                    
-                    # Độ dài trung bình của text
-                    avg_length = df[col].astype(str).str.len().mean()
-                    if avg_length > 20:  # Text dài hơn 20 ký tự
-                        score += avg_length / 10
-                    
-                    # Số từ trung bình
-                    word_count = df[col].astype(str).str.split().str.len().mean()
-                    if word_count > 3:  # Có nhiều hơn 3 từ
-                        score += word_count * 2
-                    
-                    # Độ đa dạng của nội dung (không phải giá trị lặp lại)
-                    unique_ratio = df[col].nunique() / len(df)
-                    if unique_ratio > 0.5:  # Hơn 50% giá trị là unique
-                        score += unique_ratio * 100
-                    
-                    # Không phải cột ID, code, số hoặc Item/Menu (trừ khi có chữ review)
-                    excluded_review_keywords = ['id', 'code', 'number', 'num', 'no', 'stt', 'index', 'item', 'menu', 'product', 'món', 'tên', 'category', 'sản phẩm']
-                    has_review_keyword = any(k in col_lower for k in ['review', 'comment', 'feedback', 'đánh giá', 'nhận xét'])
-                    
-                    if any(keyword in col_lower for keyword in excluded_review_keywords) and not has_review_keyword:
-                         score -= 100 # Penalize heavily
-                    else:
-                         score += 50
-                    
-                    if score > 30:  # Ngưỡng tối thiểu
-                        text_columns.append(col)
-                        text_scores[col] = score
-            
-            # Sắp xếp theo điểm và lấy các cột tốt nhất
-            if text_columns:
+            if len(text_df.columns) > 0:
+                text_str = text_df.astype(str)
+                
+                # Độ dài trung bình của text
+                avg_length = text_str.apply(lambda c: c.str.len().mean())
+                # Số từ trung bình (đếm các đoạn không phải khoảng trắng, không tạo list từ cho mỗi ô)
+                word_count = text_str.apply(lambda c: c.str.count(r'\S+').mean())
+                # Độ đa dạng của nội dung (không phải giá trị lặp lại)
+                unique_ratio = text_df.nunique() / len(df)
+                
+                # Không phải cột ID, code, số hoặc Item/Menu (trừ khi có chữ review)
+                col_names = pd.Series(text_df.columns, index=text_df.columns)
+                is_excluded = (
+                    col_names.str.contains(_NON_REVIEW_COL_RE)
+                    & ~col_names.str.contains(_EXPLICIT_REVIEW_COL_RE)
+                )
+                
+                # Tính điểm dựa trên nhiều yếu tố
+                text_scores = (
+                    avg_length.where(avg_length > 20, 0) / 10  # Text dài hơn 20 ký tự
+                    + (word_count * 2).where(word_count > 3, 0)  # Có nhiều hơn 3 từ
+                    + (unique_ratio * 100).where(unique_ratio > 0.5, 0)  # Hơn 50% giá trị là unique
+                    + is_excluded.map({True: -100, False: 50})  # Penalize heavily
+                )
+                
+                # Ngưỡng tối thiểu, sắp xếp theo điểm và lấy tối đa 3 cột text tốt nhất
+                text_columns = [col for col in text_scores.index if text_scores[col] > 30]
                 text_columns.sort(key=lambda x: text_scores[x], reverse=True)
-                # Lấy tối đa 3 cột text tốt nhất
                 review_cols = text_columns[:3]
         
         # Bước 3: Xác định cột review chính
@@ -156,8 +624,7 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
             if len(review_cols) > 1:
                 # Tìm cột có tên rõ ràng nhất
                 for col in review_cols:
-                    col_lower = col.lower()
-                    if any(keyword in col_lower for keyword in ['review', 'comment', 'feedback', 'đánh giá', 'nhận xét']):
+                    if _EXPLICIT_REVIEW_COL_RE.search(col):
                         review_col = col
                         break
         else:
@@ -165,85 +632,58 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
         
         # Bước 3: Tìm cột source bằng từ khóa (CHỈ các từ khóa rõ ràng, không nhầm lẫn)
         # Loại trừ các cột có thể nhầm lẫn: "Link Source", "review_text", "address", v.v.
-        excluded_keywords = ['link', 'url', 'review', 'text', 'address', 'name', 'description', 'content']
-        
-        possible_source_names = [
-            'source', 'nguồn', 'shop_type', 'store_type', 'competitor', 'đối thủ'
-        ]
-        
-        for col in df.columns:
-            col_lower = col.lower().strip()
-            
-            # Bỏ qua nếu cột có từ khóa bị loại trừ (trừ khi là "source" chính xác)
-            if any(excluded in col_lower for excluded in excluded_keywords) and col_lower != 'source':
-                continue
-            
+        # Bỏ qua các cột có từ khóa bị loại trừ (trừ khi là "source" chính xác) - một mask cho mọi cột
+        source_name_excluded = df.columns.str.contains(_SOURCE_NAME_EXCLUDED_RE, na=False) & (df.columns != 'source')
+        for col in df.columns[~source_name_excluded]:
             # Chỉ chấp nhận nếu tên cột khớp chính xác
-            if col_lower == 'source' or col_lower == 'nguồn':
+            if col in _SOURCE_COL_NAMES:
                 source_col = col
                 break
             # Hoặc các từ khóa rõ ràng khác
-            elif col_lower in ['shop_type', 'store_type']:
+            elif col in _SHOP_TYPE_COL_NAMES:
                 # Kiểm tra giá trị trong cột có phải là MY_SHOP/COMPETITOR không
-                sample_vals = df[col].astype(str).str.upper().str.strip().unique()[:5]
-                if any(val in ['MY_SHOP', 'COMPETITOR', 'MY SHOP', 'CỦA MÌNH', 'ĐỐI THỦ'] for val in sample_vals):
+                if _sample_has_label(df[col], 5, _SHOP_TYPE_SOURCE_VALUES):
                     source_col = col
                     break
         
         # Bước 4: Nếu không tìm thấy source, thử phân tích giá trị trong các cột
         # QUAN TRỌNG: Loại trừ các cột có thể nhầm lẫn (review, text, link, address, name)
         if source_col is None:
-            # Loại trừ các cột không phải source
-            excluded_keywords_in_col = ['review', 'text', 'desc', 'content', 'comment', 
-                                       'address', 'name', 'link', 'url', 'item', 'menu', 
-                                       'price', 'rating', 'date', 'user', 'customer']
-            
-            for col in df.columns:
-                col_lower = col.lower()
-                
-                # Bỏ qua nếu cột có từ khóa bị loại trừ
-                if any(excluded in col_lower for excluded in excluded_keywords_in_col):
-                    continue
-                
+            # Loại trừ các cột không phải source (mask tính một lần cho mọi cột)
+            source_value_excluded = df.columns.str.contains(_SOURCE_VALUE_EXCLUDED_RE, na=False)
+            for col in df.columns[~source_value_excluded]:
                 # Bỏ qua cột review đã chọn
                 if col == review_col:
                     continue
                 
                 if df[col].dtype == 'object':
-                    unique_vals = df[col].astype(str).str.upper().str.strip().unique()[:10]
                     # CHỈ chấp nhận nếu có giá trị CHÍNH XÁC là MY_SHOP hoặc COMPETITOR
-                    exact_source_values = ['MY_SHOP', 'COMPETITOR', 'MY SHOP', 'CỦA MÌNH', 'ĐỐI THỦ', 'COMPETITORS']
-                    matching_vals = [val for val in unique_vals if val in exact_source_values]
-                    
-                    # Phải có ít nhất 1 giá trị khớp và không phải tất cả giá trị đều giống nhau (trừ khi chỉ có 1 giá trị)
-                    if matching_vals and (len(unique_vals) == 1 or len(set(unique_vals)) > 1):
+                    # trong 10 giá trị unique đầu tiên
+                    if _sample_has_label(df[col], 10, _EXACT_SOURCE_VALUES):
                         source_col = col
                         break
         
         # Bước 5: Nếu vẫn không tìm thấy review, thử kiểm tra xem có phải là file Menu/Bảng giá không
         if review_col is None:
             # Check for Menu keywords
-            item_keywords = ['product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm']
-            price_keywords = ['price', 'cost', 'amount', 'giá', 'đơn giá', 'tiền']
-            
             item_col_name = None
             found_price = False
             
             for col in df.columns:
-                col_lower = col.lower()
                 # Exclude ID/Code columns
-                if any(x in col_lower for x in ['code', 'id', 'mã', 'stt', 'no.', 'order']):
+                if _MENU_ID_COL_RE.search(col):
                     continue
                     
-                if any(k in col_lower for k in item_keywords) and not item_col_name: 
+                if _MENU_ITEM_COL_RE.search(col) and not item_col_name: 
                     item_col_name = col
-                if any(k in col_lower for k in price_keywords): 
+                if _MENU_PRICE_COL_RE.search(col): 
                     found_price = True
             
             if item_col_name and found_price:
                 # Đây là file Menu -> Tạo cột review giả UNIQUE để tránh bị drop_duplicates lọc mất
                 # Thêm index để đảm bảo unique 100%
-                df['dummy_review'] = "Menu Item: " + df[item_col_name].astype(str) + " #" + df.index.astype(str)
+                # (một lần str.cat thay cho hai phép nối Series; giữ nhãn index gốc làm hậu tố)
+                df['dummy_review'] = ("Menu Item: " + df[item_col_name].astype(str)).str.cat(df.index.astype(str), sep=" #")
                 review_col = 'dummy_review'
             else:
                 # Báo lỗi như cũ
@@ -258,32 +698,11 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
             detection_method = None
             
             # Phương pháp 1: Phát hiện từ tên file (mở rộng từ khóa)
-            file_name_lower = (file_name or '').lower()
-            
-            # Từ khóa đối thủ (mở rộng)
-            competitor_keywords = [
-                'competitor', 'đối thủ', 'rival', 'competitors',
-                # Thương hiệu cà phê
-                'starbucks', 'phuc long', 'phuclong', 'katinat', 'highlands', 'highland',
-                'trung nguyen', 'trungnguyen', 'the coffee house', 'coffee house',
-                'cong ca phe', 'congcaphe', 'passio', 'gong cha', 'gongcha',
-                # Nền tảng
-                'shopee', 'lazada', 'grab', 'now', 'baemin', 'gojek', 'go food',
-                # Từ khóa khác
-                'other', 'others', 'competition', 'market'
-            ]
-            
-            # Từ khóa quán mình
-            my_shop_keywords = [
-                'my_shop', 'myshop', 'của mình', 'cua minh', 'my store', 'mystore',
-                'our shop', 'ourshop', 'our store', 'ourstore', 'my_', 'my-',
-                'own', 'self', 'internal', 'nội bộ', 'noi bo'
-            ]
-            
-            if any(keyword in file_name_lower for keyword in competitor_keywords):
+            # Từ khóa đối thủ / quán mình (mở rộng)
+            if _COMPETITOR_FILE_RE.search(file_name_lower):
                 detected_source = 'COMPETITOR'
                 detection_method = f"tên file '{file_name}'"
-            elif any(keyword in file_name_lower for keyword in my_shop_keywords):
+            elif _MY_SHOP_FILE_RE.search(file_name_lower):
                 detected_source = 'MY_SHOP'
                 detection_method = f"tên file '{file_name}'"
             
@@ -293,21 +712,12 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
                 for col in df.columns:
                     if col != review_col and df[col].dtype == 'object':
                         # Lấy mẫu giá trị để phân tích
-                        sample_values = df[col].astype(str).str.lower().str.strip().dropna().unique()[:20]
-                        
-                        # Kiểm tra xem có chứa tên thương hiệu đối thủ không
-                        competitor_brands_in_data = [
-                            'starbucks', 'phuc long', 'highlands', 'katinat', 
-                            'trung nguyen', 'coffee house', 'cong ca phe'
-                        ]
-                        
-                        for val in sample_values:
-                            if any(brand in val for brand in competitor_brands_in_data):
-                                detected_source = 'COMPETITOR'
-                                detection_method = f"nội dung cột '{column_mapping.get(col, col)}'"
-                                break
+                        sample_values = _first_unique_values(df[col], 20, _lower_stripped)
                         
-                        if detected_source:
+                        # Kiểm tra xem có chứa tên thương hiệu đối thủ không (một lần search cho cả mẫu)
+                        if _COMPETITOR_BRAND_RE.search('\n'.join(sample_values)):
+                            detected_source = 'COMPETITOR'
+                            detection_method = f"nội dung cột '{column_mapping.get(col, col)}'"
                             break
             
             # Áp dụng kết quả phát hiện (lưu thông tin để hiển thị sau)
@@ -326,30 +736,11 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
             else:
                 # Phân tích tên file để xác định shop/brand cụ thể
                 shop_name = None
-                file_name_lower = (file_name or '').lower()
                 
-                # Tìm tên shop từ tên file
-                shop_keywords = {
-                    'starbucks': 'STARBUCKS',
-                    'phuc long': 'PHUC_LONG',
-                    'phuclong': 'PHUC_LONG',
-                    'highlands': 'HIGHLANDS',
-                    'highland': 'HIGHLANDS',
-                    'katinat': 'KATINAT',
-                    'trung nguyen': 'TRUNG_NGUYEN',
-                    'trungnguyen': 'TRUNG_NGUYEN',
-                    'coffee house': 'COFFEE_HOUSE',
-                    'cong ca phe': 'CONG_CA_PHE',
-                    'congcaphe': 'CONG_CA_PHE',
-                    'passio': 'PASSIO',
-                    'gong cha': 'GONG_CHA',
-                    'gongcha': 'GONG_CHA'
-                }
-                
-                for keyword, shop in shop_keywords.items():
-                    if keyword in file_name_lower:
-                        shop_name = shop
-                        break
+                # Tìm tên shop từ tên file (một lần search cho tất cả từ khóa)
+                shop_match = _SHOP_NAME_RE.search(file_name_lower)
+                if shop_match:
+                    shop_name = _SHOP_NAME_KEYWORDS[shop_match.group(0)]
                 
                 if shop_name:
                     file_detection_info['source'] = 'COMPETITOR'
@@ -375,19 +766,19 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
         # Bước 7: Kết hợp nhiều cột review nếu có
         if review_cols and len(review_cols) > 1:
             # Kết hợp các cột review lại thành một
-            review_parts = []
-            for col in review_cols:
-                if col != review_col:  # Bỏ qua cột chính đã chọn
-                    review_parts.append(df[col].astype(str))
+            # (bỏ qua cột chính đã chọn, giá trị 'nan' coi như trống)
+            review_parts = [
+                df[col].astype(str).replace('nan', '').str.strip()
+                for col in review_cols if col != review_col
+            ]
             
             if review_parts:
-                # Kết hợp với cột chính
-                combined_review = df[review_col].astype(str)
+                # Chỉ nối phần không trống; khoảng trắng bên trong review giữ nguyên
+                combined_review = df[review_col].astype(str).str.strip()
                 for part in review_parts:
-                    # Chỉ thêm phần không trống và không trùng với cột chính
-                    part_clean = part.replace('nan', '').str.strip()
-                    combined_review = combined_review + ' ' + part_clean
-                    combined_review = combined_review.str.strip()
+                    combined_review = combined_review.mask(
+                        part != '', (combined_review + ' ' + part).str.lstrip()
+                    )
                 
                 df[review_col] = combined_review
                 # Lưu thông tin để hiển thị sau (không hiển thị ngay)
@@ -397,190 +788,76 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
                 combined_cols_info['cols'] = [column_mapping.get(c, c) for c in review_cols]
         
         # Bước 7: Tìm các cột bổ sung (giá, menu, rating, v.v.) - MỞ RỘNG
-        additional_cols = {}
-        
-        # Tìm cột giá - MỞ RỘNG từ khóa
-        price_keywords = [
-            'price', 'giá', 'cost', 'chi phí', 'amount', 'số tiền', 'money', 'giá cả',
-            'gia', 'don gia', 'đơn giá', 'gia_ban', 'gia ban', 'price_range', 'pricing',
-            'giá bán', 'giá trị', 'value', 'cost_price', 'selling_price', 'unit_price',
-            'giá tiền', 'tien', 'tiền', 'vnd', 'dong', 'đồng', 'usd', 'currency',
-            'gia_hien_thi', 'gia hien thi', 'display_price', 'final_price', 'total_price'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col]:
-                col_lower = col.lower().strip()
-                # Kiểm tra chính xác hoặc chứa từ khóa
-                if any(keyword in col_lower or col_lower == keyword for keyword in price_keywords):
-                    # Kiểm tra xem cột có chứa giá trị số không
-                    if df[col].dtype in ['int64', 'float64'] or pd.to_numeric(df[col], errors='coerce').notna().sum() > len(df) * 0.3:
-                        additional_cols['price'] = col
-                        break
-        
-        # Tìm cột rating/điểm đánh giá - MỞ RỘNG
-        rating_keywords = [
-            'rating', 'điểm', 'score', 'star', 'sao', 'đánh giá số', 'rate',
-            'diem', 'danh gia', 'stars', 'rating_score', 'review_score', 'overall_rating',
-            'customer_rating', 'user_rating', 'quality_score', 'satisfaction', 'mức độ hài lòng',
-            'điểm số', 'diem so', 'đánh giá', 'danh gia', 'vote', 'votes', 'likes'
-        ]
+        # Một lượt duyệt qua các cột: mỗi cột nhận trường đầu tiên (theo thứ tự ưu tiên)
+        # còn trống mà nó khớp - cho kết quả giống việc tìm lần lượt từng trường
+        found_cols = {}
         for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower or col_lower == keyword for keyword in rating_keywords):
-                    additional_cols['rating'] = col
-                    break
-        
-        # Tìm cột menu/sản phẩm - MỞ RỘNG
-        menu_keywords = [
-            'menu', 'product', 'sản phẩm', 'item', 'món', 'dish', 'drink', 'đồ uống', 
-            'food', 'thức ăn', 'san pham', 'ten mon', 'tên món', 'product_name', 
-            'item_name', 'menu_item', 'dish_name', 'product_title', 'item_title',
-            'tên sản phẩm', 'ten san pham', 'món ăn', 'mon an', 'đồ ăn', 'do an',
-            'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'brand', 'thương hiệu'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                # Loại trừ các cột ID/code
-                if any(x in col_lower for x in ['code', 'id', 'mã', 'stt', 'no.', 'order', '_no', '_id']):
+            if col in (review_col, source_col):
+                continue
+            for field, pattern, excluded in _ADDITIONAL_COL_PATTERNS:
+                if field in found_cols or not pattern.search(col):
                     continue
-                if any(keyword in col_lower or col_lower == keyword for keyword in menu_keywords):
-                    additional_cols['menu'] = col
-                    break
-        
-        # Tìm cột ngày tháng - MỞ RỘNG
-        date_keywords = [
-            'date', 'ngày', 'time', 'thời gian', 'created', 'updated', 'timestamp',
-            'ngay', 'thoi gian', 'created_at', 'updated_at', 'created_date', 'updated_date',
-            'review_date', 'comment_date', 'post_date', 'publish_date', 'datetime', 'date_time',
-            'ngày đánh giá', 'ngay danh gia', 'ngày tạo', 'ngay tao', 'thời điểm', 'thoi diem'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower or col_lower == keyword for keyword in date_keywords):
-                    additional_cols['date'] = col
-                    break
-        
-        # Tìm cột tên khách hàng/user - MỞ RỘNG
-        user_keywords = [
-            'user', 'customer', 'khách hàng', 'name', 'tên', 'author', 'người đánh giá',
-            'khach hang', 'nguoi danh gia', 'reviewer', 'reviewer_name', 'customer_name',
-            'user_name', 'username', 'full_name', 'tên khách', 'ten khach', 'người dùng',
-            'nguoi dung', 'buyer', 'purchaser', 'client', 'visitor', 'guest'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                # Loại trừ các cột có thể nhầm lẫn (như Restaurant Name, Address)
-                if any(excluded in col_lower for excluded in ['restaurant', 'shop', 'store', 'address', 'location', 'link']):
+                # Loại trừ các cột ID/code (menu) hoặc dễ nhầm lẫn như Restaurant Name, Address (user)
+                if excluded is not None and excluded.search(col):
                     continue
-                if any(keyword in col_lower or col_lower == keyword for keyword in user_keywords):
-                    additional_cols['user'] = col
-                    break
-        
-        # Tìm thêm các cột khác có thể hữu ích
-        # Cột địa chỉ/location
-        location_keywords = [
-            'location', 'address', 'địa chỉ', 'dia chi', 'place', 'venue', 'vị trí', 'vi tri',
-            'city', 'thành phố', 'thanh pho', 'district', 'quận', 'quan', 'ward', 'phường', 'phuong',
-            'street', 'đường', 'duong', 'area', 'khu vực', 'khu vuc'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower or col_lower == keyword for keyword in location_keywords):
-                    additional_cols['location'] = col
-                    break
-        
-        # Cột số lượng/quantity
-        quantity_keywords = [
-            'quantity', 'qty', 'số lượng', 'so luong', 'amount', 'số', 'so', 'count',
-            'quantity_ordered', 'qty_ordered', 'units', 'số đơn', 'so don', 'volume'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower or col_lower == keyword for keyword in quantity_keywords):
-                    additional_cols['quantity'] = col
-                    break
+                # Cột giá phải chứa giá trị số (ước lượng tỷ lệ trên các dòng mẫu đầu)
+                if field == 'price' and not (
+                    df[col].dtype in ['int64', 'float64']
+                    or pd.to_numeric(df[col].head(_NUMERIC_SAMPLE_ROWS), errors='coerce').notna().mean() > 0.3
+                ):
+                    continue
+                found_cols[field] = col
+                break
+            if len(found_cols) == len(_ADDITIONAL_COL_PATTERNS):
+                break
         
-        # Cột danh mục/category
-        category_keywords = [
-            'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'group', 'nhóm', 'nhom',
-            'classification', 'class', 'tag', 'tags', 'label', 'labels', 'genre', 'thể loại', 'the loai'
-        ]
-        for col in df.columns:
-            if col not in [review_col, source_col] and col not in additional_cols.values():
-                col_lower = col.lower().strip()
-                if any(keyword in col_lower or col_lower == keyword for keyword in category_keywords):
-                    additional_cols['category'] = col
-                    break
+        # Giữ thứ tự trường như trước (price, rating, menu, ...)
+        additional_cols = {
+            field: found_cols[field] for field, _, _ in _ADDITIONAL_COL_PATTERNS if field in found_cols
+        }
         
         # Giữ lại TẤT CẢ các cột để không bị mất dữ liệu quan trọng cho các bước sau (như extract_price_data)
-        df_clean = df.copy()
-        
         # Đổi tên các cột đã nhận diện được cho chuẩn format của App
         rename_dict = {review_col: 'review', source_col: 'source'}
         for key, col in additional_cols.items():
             rename_dict[col] = key
         
-        # Thực hiện đổi tên
-        df_clean = df_clean.rename(columns=rename_dict)
+        # Thực hiện đổi tên (rename đã trả về DataFrame mới, không cần df.copy() trước đó)
+        df_clean = df.rename(columns=rename_dict)
         
         # Loại bỏ dòng có review trống hoặc chỉ có khoảng trắng
-        df_clean = df_clean[df_clean['review'].notna()]
-        df_clean['review'] = df_clean['review'].astype(str).str.strip()
-        df_clean = df_clean[df_clean['review'] != '']
-        df_clean = df_clean[df_clean['review'].str.lower() != 'nan']
-        df_clean = df_clean[df_clean['review'].str.len() > 3]  # Ít nhất 3 ký tự
+        # (gộp các điều kiện thành một mask, lọc DataFrame đúng một lần)
+        review_text = _as_text(df_clean['review']).str.strip()
+        keep_mask = (
+            df_clean['review'].notna()
+            & (review_text.str.len() > 3)  # Ít nhất 3 ký tự (loại luôn chuỗi rỗng)
+            & (review_text.str.lower() != 'nan')
+        )
+        df_clean['review'] = review_text
+        df_clean = df_clean[keep_mask]
         
         # Chuẩn hóa source (MY_SHOP, COMPETITOR)
-        df_clean['source'] = df_clean['source'].astype(str).str.strip().str.upper()
-        
-        # Mapping các giá trị source phổ biến
-        source_mapping = {
-            'MY_SHOP': 'MY_SHOP',
-            'MY SHOP': 'MY_SHOP',
-            'CỦA MÌNH': 'MY_SHOP',
-            'CUA MINH': 'MY_SHOP',
-            'SHOP': 'MY_SHOP',
-            'STORE': 'MY_SHOP',
-            'BRAND': 'MY_SHOP',
-            'COMPETITOR': 'COMPETITOR',
-            'COMPETITORS': 'COMPETITOR',
-            'ĐỐI THỦ': 'COMPETITOR',
-            'DOI THU': 'COMPETITOR',
-            'COMPETITION': 'COMPETITOR',
-            'RIVAL': 'COMPETITOR'
-        }
-        
-        # Áp dụng mapping
-        df_clean['source'] = df_clean['source'].replace(source_mapping)
-        
-        # Nếu giá trị không khớp, mặc định là MY_SHOP
-        df_clean['source'] = df_clean['source'].apply(
-            lambda x: 'MY_SHOP' if x not in ['MY_SHOP', 'COMPETITOR'] else x
+        # Áp dụng mapping các giá trị source phổ biến (mapping có cả giá trị chuẩn),
+        # giá trị không khớp mặc định là MY_SHOP
+        df_clean['source'] = pd.Categorical(
+            _as_text(df_clean['source']).str.strip().str.upper().map(_SOURCE_MAPPING).fillna('MY_SHOP'),
+            categories=_SOURCE_CATEGORIES
         )
         
         if len(df_clean) == 0:
             # Fallback for Menu Files that might have been filtered out
             # Check if original df had Item and Price
-            item_keywords = ['product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'ten mon', 'san pham']
-            price_keywords = ['price', 'cost', 'amount', 'giá', 'đơn giá', 'tiền', 'gia', 'don gia']
-            
-            has_item = any(any(k in col.lower() for k in item_keywords) for col in df.columns)
-            has_price = any(any(k in col.lower() for k in price_keywords) for col in df.columns)
+            has_item = any(_FALLBACK_ITEM_COL_RE.search(col) for col in df.columns)
+            has_price = any(_FALLBACK_PRICE_COL_RE.search(col) for col in df.columns)
             
             if has_item and has_price:
                  # Salvage: Force create dummy review
                  df_clean = df.copy()
                  # Find item col again
-                 item_col = next((c for c in df.columns if any(k in c.lower() for k in item_keywords)), df.columns[0])
-                 df_clean['review'] = "Menu Item: " + df_clean[item_col].astype(str) + " #" + df_clean.index.astype(str)
+                 item_col = next((c for c in df.columns if _FALLBACK_ITEM_COL_RE.search(c)), df.columns[0])
+                 df_clean['review'] = ("Menu Item: " + df_clean[item_col].astype(str)).str.cat(df_clean.index.astype(str), sep=" #")
                  df_clean['source'] = 'MY_SHOP' # Default
-                 return df_clean
+                 return df_clean, None
 
             error_msg = f"Không có dữ liệu hợp lệ sau khi làm sạch. Vui lòng kiểm tra lại file.\nDebug Cols: {list(df.columns)}"
             raise ValueError(error_msg)
@@ -594,15 +871,9 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
             actual_source = df['source'].iloc[0] if len(df) > 0 else 'COMPETITOR'
             
             # Kiểm tra xem có phát hiện từ tên file không
-            file_name_lower = (file_name or '').lower()
-            competitor_keywords = ['competitor', 'đối thủ', 'starbucks', 'phuc long', 'katinat', 
-                                 'highlands', 'trung nguyen', 'shopee', 'lazada', 'grab', 
-                                 'now', 'baemin', 'gojek', 'competitors', 'rival']
-            my_shop_keywords = ['my_shop', 'của mình', 'my store', 'our shop', 'our store', 'my_']
-            
-            if any(keyword in file_name_lower for keyword in competitor_keywords):
+            if _COMPETITOR_FILE_DISPLAY_RE.search(file_name_lower):
                 source_col_display = f'Tự động từ tên file: COMPETITOR'
-            elif any(keyword in file_name_lower for keyword in my_shop_keywords):
+            elif _MY_SHOP_FILE_DISPLAY_RE.search(file_name_lower):
                 source_col_display = f'Tự động từ tên file: MY_SHOP'
             else:
                 # Hiển thị source thực tế (có thể là COMPETITOR nếu không phát hiện được MY_SHOP)
@@ -624,17 +895,69 @@ def load_and_clean_data(uploaded_file, file_name: str = None) -> pd.DataFrame:
             'has_warning': file_detection_info.get('has_warning', False) if 'file_detection_info' in locals() else False
         }
         
-        # Lưu vào session state để app.py hiển thị
-        if 'file_summaries' not in st.session_state:
-            st.session_state['file_summaries'] = []
-        st.session_state['file_summaries'].append(file_summary)
+        # Thu nhỏ kiểu số nguyên của các cột điểm/số lượng (vd. rating 1-5 -> int8)
+        # Không áp dụng cho price (extract_price_data nhân x1000 trên từng giá trị) và cột số thực
+        for col in _DOWNCAST_INT_COLS:
+            if col in df_clean.columns and pd.api.types.is_integer_dtype(df_clean[col]):
+                df_clean[col] = pd.to_numeric(df_clean[col], downcast='integer')
         
-        return df_clean.reset_index(drop=True)
+        return df_clean.reset_index(drop=True), file_summary
     
     except Exception as e:
         raise Exception(f"Lỗi khi đọc file: {str(e)}")
 
 
+def _select_diverse(review_hashes, sample_size: int) -> List[int]:
+    """
+    Chọn top reviews (đã sắp theo priority) nhưng đảm bảo đa dạng
+    
+    Args:
+        review_hashes: Hash của từng review theo thứ tự ưu tiên giảm dần
+        sample_size: Số review cần chọn
+    
+    Returns:
+        List vị trí (trong review_hashes) được chọn
+    """
+    picked = []
+    seen_hashes = set()
+    for i, review_hash in enumerate(review_hashes):
+        if len(picked) >= sample_size:
+            break
+        # Chỉ thêm nếu chưa có review tương tự (hash khác)
+        if review_hash not in seen_hashes:
+            picked.append(i)
+            seen_hashes.add(review_hash)
+        elif len(picked) < sample_size * 0.8:  # Cho phép 20% trùng lặp
+            picked.append(i)
+    return picked
+
+
+@functools.lru_cache(maxsize=128)
+def _ai_column_mapping(columns: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Nhận diện cột bổ sung (price, rating, menu, ...) theo tên cột, kết quả được nhớ theo bộ tên cột
+    
+    Args:
+        columns: Tuple tên cột của DataFrame
+    
+    Returns:
+        Tuple các cặp (trường chuẩn, tên cột trong DataFrame) theo thứ tự _AI_COL_PATTERNS
+    """
+    mapping = []
+    # Find best matching columns if standard names don't exist
+    # Mở rộng để tìm nhiều loại cột hơn (tên cột chỉ lowercase/strip một lần)
+    col_lowers = [(c, c.lower().strip()) for c in columns]
+    for target, pattern in _AI_COL_PATTERNS:
+        if target in columns:
+            mapping.append((target, target))
+        else:
+            # Find first matching column (case-insensitive, flexible matching)
+            match = next((c for c, c_lower in col_lowers if pattern.search(c_lower)), None)
+            if match:
+                mapping.append((target, match))
+    return tuple(mapping)
+
+
 def prepare_reviews_for_ai(df: pd.DataFrame, max_reviews: int = 500) -> List[Dict[str, Any]]:
     """
     Chuyển đổi DataFrame thành format để gửi cho AI
@@ -653,196 +976,98 @@ def prepare_reviews_for_ai(df: pd.DataFrame, max_reviews: int = 500) -> List[Dic
     # Nếu có quá nhiều reviews, sử dụng sampling thông minh với chọn lọc tốt hơn
     if total_reviews > max_reviews:
         # Tính điểm ưu tiên cho mỗi review (scoring system)
-        df = df.copy()
-        df['_priority_score'] = 0
+        # Điểm và hash giữ trong mảng numpy riêng: không cần df.copy() để thêm cột tạm
+        # Chuỗi review và bản lowercase chỉ tính một lần cho các bước chấm điểm
+        review_text = df['review'].astype(str)
+        review_lower = review_text.str.lower()
         
         # 1. Điểm cho độ dài review (reviews dài thường có nhiều thông tin hơn)
-        df['_review_length'] = df['review'].astype(str).str.len()
-        df['_priority_score'] += df['_review_length'].apply(lambda x: min(x / 100, 5))  # Tối đa 5 điểm
+        scores = np.minimum(review_text.str.len().to_numpy() / 100, 5)  # Tối đa 5 điểm
         
         # 2. Điểm cho thông tin bổ sung (có price, rating, menu, date, user)
         info_columns = ['price', 'rating', 'menu', 'date', 'user', 'location', 'quantity', 'category']
         for col in info_columns:
             if col in df.columns:
-                df['_priority_score'] += df[col].notna().astype(int) * 2  # Mỗi thông tin bổ sung = 2 điểm
+                scores += df[col].notna().to_numpy(dtype=int) * 2  # Mỗi thông tin bổ sung = 2 điểm
         
         # 3. Điểm cho rating (reviews có rating cao hoặc thấp đều quan trọng)
         if 'rating' in df.columns:
             # Chuyển rating sang số nếu có thể
-            df['_rating_num'] = pd.to_numeric(df['rating'], errors='coerce')
+            rating_num = pd.to_numeric(df['rating'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
             # Ưu tiên rating cực cao (5) hoặc cực thấp (1-2) vì chúng có insights rõ ràng
-            df['_priority_score'] += df['_rating_num'].apply(
-                lambda x: 3 if pd.notna(x) and (x >= 4.5 or x <= 2) else (1 if pd.notna(x) else 0)
+            scores += np.select(
+                [(rating_num >= 4.5) | (rating_num <= 2), ~np.isnan(rating_num)], [3, 1], 0
             )
         
         # 4. Điểm cho độ đa dạng (tránh chọn nhiều reviews giống nhau)
-        # Sử dụng hash của review để nhóm các reviews tương tự
-        df['_review_hash'] = df['review'].astype(str).str.lower().str.strip().apply(hash)
+        # Sử dụng hash của review đã chuẩn hóa (bỏ dấu câu, gộp khoảng trắng) để nhóm
+        # các reviews gần trùng (chỉ khác dấu câu/khoảng trắng/hoa thường)
+        hashes = review_lower.str.replace(_REVIEW_NOISE_RE, ' ', regex=True).str.strip().apply(hash).to_numpy()
         
         # 5. Điểm cho từ khóa quan trọng (từ khóa liên quan đến SWOT)
-        important_keywords = [
-            'tốt', 'tuyệt', 'xuất sắc', 'tệ', 'kém', 'chậm', 'nhanh', 'đắt', 'rẻ', 'giá',
-            'nhân viên', 'phục vụ', 'dịch vụ', 'chất lượng', 'ngon', 'dở', 'sạch', 'bẩn',
-            'không gian', 'vị trí', 'thuận tiện', 'đông', 'vắng', 'yên tĩnh', 'ồn ào',
-            'đề xuất', 'khuyên', 'không nên', 'tránh', 'nên thử', 'quay lại', 'không quay lại',
-            'good', 'excellent', 'bad', 'poor', 'slow', 'fast', 'expensive', 'cheap', 'price',
-            'staff', 'service', 'quality', 'delicious', 'dirty', 'clean', 'space', 'location'
-        ]
-        df['_keyword_count'] = df['review'].astype(str).str.lower().apply(
-            lambda x: sum(1 for kw in important_keywords if kw in x)
+        # Đếm số từ khóa KHÁC NHAU xuất hiện, duyệt thẳng list chuỗi Python (phép `in` của str
+        # nhanh hơn một lượt str.contains của Arrow cho mỗi từ khóa)
+        keyword_count = np.fromiter(
+            (sum(kw in text for kw in _IMPORTANT_KEYWORDS) for text in review_lower.tolist()),
+            dtype=np.int64, count=total_reviews
         )
-        df['_priority_score'] += df['_keyword_count'] * 0.5  # Mỗi từ khóa = 0.5 điểm
-        
-        # Tách MY_SHOP và COMPETITOR để chọn lọc riêng
-        my_shop_df = df[df['source'] == 'MY_SHOP'].copy()
-        competitor_df = df[df['source'] == 'COMPETITOR'].copy()
-        
-        # Tính tỷ lệ để giữ cân bằng
-        my_shop_ratio = len(my_shop_df) / total_reviews if total_reviews > 0 else 0.5
-        competitor_ratio = len(competitor_df) / total_reviews if total_reviews > 0 else 0.5
-        
-        # Lấy mẫu thông minh cho MY_SHOP
-        my_shop_sample_size = int(max_reviews * my_shop_ratio)
-        if len(my_shop_df) > 0 and my_shop_sample_size > 0:
-            # Sắp xếp theo priority score và chọn đa dạng
-            my_shop_df = my_shop_df.sort_values('_priority_score', ascending=False)
-            
-            # Chọn top reviews nhưng đảm bảo đa dạng (không chọn quá nhiều reviews giống nhau)
-            selected_my_shop = []
-            seen_hashes = set()
-            
-            for _, row in my_shop_df.iterrows():
-                if len(selected_my_shop) >= my_shop_sample_size:
-                    break
-                # Chỉ thêm nếu chưa có review tương tự (hash khác)
-                review_hash = row['_review_hash']
-                if review_hash not in seen_hashes:
-                    selected_my_shop.append(row)
-                    seen_hashes.add(review_hash)
-                elif len(selected_my_shop) < my_shop_sample_size * 0.8:  # Cho phép 20% trùng lặp
-                    selected_my_shop.append(row)
-            
-            my_shop_sample = pd.DataFrame(selected_my_shop)
-        else:
-            my_shop_sample = pd.DataFrame()
-        
-        # Lấy mẫu thông minh cho COMPETITOR
-        competitor_sample_size = max_reviews - len(my_shop_sample)
-        if len(competitor_df) > 0 and competitor_sample_size > 0:
-            # Sắp xếp theo priority score
-            competitor_df = competitor_df.sort_values('_priority_score', ascending=False)
-            
-            # Chọn top reviews nhưng đảm bảo đa dạng
-            selected_competitor = []
-            seen_hashes = set()
-            
-            for _, row in competitor_df.iterrows():
-                if len(selected_competitor) >= competitor_sample_size:
-                    break
-                review_hash = row['_review_hash']
-                if review_hash not in seen_hashes:
-                    selected_competitor.append(row)
-                    seen_hashes.add(review_hash)
-                elif len(selected_competitor) < competitor_sample_size * 0.8:
-                    selected_competitor.append(row)
-            
-            competitor_sample = pd.DataFrame(selected_competitor)
-        else:
-            competitor_sample = pd.DataFrame()
-        
-        # Kết hợp lại
-        if len(my_shop_sample) > 0 and len(competitor_sample) > 0:
-            df = pd.concat([my_shop_sample, competitor_sample], ignore_index=True)
-        elif len(my_shop_sample) > 0:
-            df = my_shop_sample
-        elif len(competitor_sample) > 0:
-            df = competitor_sample
+        scores += keyword_count * 0.5  # Mỗi từ khóa = 0.5 điểm
+        
+        # Chọn lọc theo từng nguồn trên vị trí của nhóm (groupby().indices),
+        # không tách ra các DataFrame con rồi concat lại
+        group_positions = df.groupby('source', sort=False, observed=True).indices
+        selected_positions = []
+        remaining = max_reviews
+        for source in ('MY_SHOP', 'COMPETITOR'):
+            positions = group_positions.get(source)
+            if positions is None:
+                continue
+            # MY_SHOP giữ tỷ lệ theo dữ liệu, COMPETITOR lấy phần còn lại
+            sample_size = int(max_reviews * len(positions) / total_reviews) if source == 'MY_SHOP' else remaining
+            if sample_size <= 0:
+                continue
+            # Sắp xếp theo priority score (giảm dần, điểm bằng nhau giữ thứ tự gốc) và chọn đa dạng
+            order = np.argsort(-scores[positions], kind='stable')
+            ranked_positions = positions[order]
+            picked = _select_diverse(hashes[ranked_positions], sample_size)
+            selected_positions.append(ranked_positions[picked])
+            if source == 'MY_SHOP':
+                remaining = max_reviews - len(picked)
+        
+        if selected_positions:
+            # Ghép vị trí đã chọn thành một mảng int rồi lấy dòng bằng một lần iloc
+            df = df.iloc[np.concatenate(selected_positions)].reset_index(drop=True)
         else:
-            # Fallback: chọn top reviews theo priority score
-            df = df.nlargest(max_reviews, '_priority_score')
+            # Fallback: chọn top reviews theo priority score (như nlargest: bằng điểm thì dòng trước)
+            df = df.iloc[np.argsort(-scores, kind='stable')[:max_reviews]]
         
-        # Xóa các cột tạm
+        # Xóa các cột tạm (cột bắt đầu bằng '_')
         df = df.drop(columns=[col for col in df.columns if col.startswith('_')])
         
         st.info(f"📊 Đã chọn lọc {len(df):,} reviews quan trọng nhất từ {total_reviews:,} reviews (ưu tiên reviews có nhiều thông tin, đa dạng, và có từ khóa quan trọng).")
     
     # Detect smart column mappings - MỞ RỘNG để nhận diện nhiều cột hơn
-    col_mapping = {}
-    
-    # Keyword lists (enhanced - mở rộng để nhận diện nhiều cột hơn)
-    price_keywords = [
-        'price', 'cost', 'amount', 'giá', 'đơn giá', 'chi phí', 'tiền', 'gia', 'don gia', 'gia_ban',
-        'gia hien thi', 'gia_hien_thi', 'display_price', 'final_price', 'total_price', 'selling_price',
-        'unit_price', 'cost_price', 'price_range', 'pricing', 'giá bán', 'giá trị', 'value', 'vnd', 'dong'
-    ]
-    menu_keywords = [
-        'product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'food', 'drink', 'name', 'tên', 
-        'ten mon', 'san pham', 'product_name', 'item_name', 'menu_item', 'dish_name', 'product_title',
-        'tên sản phẩm', 'ten san pham', 'món ăn', 'mon an', 'đồ ăn', 'do an', 'category', 'danh mục',
-        'type', 'loại', 'loai', 'brand', 'thương hiệu'
-    ]
-    rating_keywords = [
-        'rating', 'score', 'star', 'điểm', 'sao', 'đánh giá', 'danh gia', 'diem', 'stars', 'rating_score',
-        'review_score', 'overall_rating', 'customer_rating', 'user_rating', 'quality_score', 'satisfaction',
-        'điểm số', 'diem so', 'vote', 'votes', 'likes'
-    ]
-    date_keywords = [
-        'date', 'time', 'ngày', 'giờ', 'thời gian', 'ngay', 'created_at', 'updated_at', 'created_date',
-        'updated_date', 'review_date', 'comment_date', 'post_date', 'publish_date', 'datetime', 'date_time',
-        'ngày đánh giá', 'ngay danh gia', 'ngày tạo', 'ngay tao', 'thời điểm', 'thoi diem'
-    ]
-    user_keywords = [
-        'user', 'customer', 'name', 'khách', 'người dùng', 'tên khách', 'khach hang', 'nguoi danh gia',
-        'reviewer', 'reviewer_name', 'customer_name', 'user_name', 'username', 'full_name', 'tên khách',
-        'ten khach', 'người dùng', 'nguoi dung', 'buyer', 'purchaser', 'client', 'visitor', 'guest'
-    ]
-    location_keywords = [
-        'location', 'address', 'địa chỉ', 'dia chi', 'place', 'venue', 'vị trí', 'vi tri',
-        'city', 'thành phố', 'thanh pho', 'district', 'quận', 'quan', 'ward', 'phường', 'phuong'
-    ]
-    quantity_keywords = [
-        'quantity', 'qty', 'số lượng', 'so luong', 'amount', 'số', 'so', 'count',
-        'quantity_ordered', 'qty_ordered', 'units', 'số đơn', 'so don', 'volume'
-    ]
-    category_keywords = [
-        'category', 'danh mục', 'danh muc', 'type', 'loại', 'loai', 'group', 'nhóm', 'nhom',
-        'classification', 'class', 'tag', 'tags', 'label', 'labels', 'genre', 'thể loại', 'the loai'
+    # (nhớ theo bộ tên cột: các lần chạy lại với cùng file không dò lại)
+    col_mapping = dict(_ai_column_mapping(tuple(df.columns)))
+
+    # Chọn cột một lần rồi đóng gói bằng to_dict('records') thay cho iterrows
+    out = pd.DataFrame({
+        'review': df['review'].astype(str),
+        'source': df['source'].astype(str)
+    })
+    for target_key, df_col in col_mapping.items():
+        out[target_key] = df[df_col]
+
+    # Dựng dict trực tiếp từ mảng của từng cột (zip), bỏ các trường thiếu giá trị
+    # như trước (review/source luôn có)
+    extra_keys = list(col_mapping)
+    extra_arrays = [out[key].to_numpy(dtype=object) for key in extra_keys]
+    reviews_list = [
+        {'review': review, 'source': source,
+         **{key: value for key, value in zip(extra_keys, extras) if pd.notna(value)}}
+        for review, source, *extras in zip(out['review'].tolist(), out['source'].tolist(), *extra_arrays)
     ]
     
-    # Find best matching columns if standard names don't exist
-    # Mở rộng để tìm nhiều loại cột hơn
-    for target, keywords in [
-        ('price', price_keywords), 
-        ('menu', menu_keywords), 
-        ('rating', rating_keywords),
-        ('date', date_keywords), 
-        ('user', user_keywords),
-        ('location', location_keywords),
-        ('quantity', quantity_keywords),
-        ('category', category_keywords)
-    ]:
-        if target in df.columns:
-             col_mapping[target] = target
-        else:
-             # Find first matching column (case-insensitive, flexible matching)
-             match = next((c for c in df.columns if any(k in c.lower().strip() for k in keywords)), None)
-             if match:
-                 col_mapping[target] = match
-
-    reviews_list = []
-    for _, row in df.iterrows():
-        review_dict = {
-            'review': str(row['review']),
-            'source': str(row['source'])
-        }
-        
-        # Add additional info using mapped columns
-        for target_key, df_col in col_mapping.items():
-            if pd.notna(row[df_col]):
-                review_dict[target_key] = row[df_col]
-        
-        reviews_list.append(review_dict)
-    
     return reviews_list
 
 
@@ -868,25 +1093,28 @@ def create_swot_pie_chart(swot_data: Dict[str, Any]) -> go.Figure:
     
     colors = ['#2ecc71', '#e74c3c', '#3498db', '#f39c12']  # Xanh lá, Đỏ, Xanh dương, Vàng
     
-    fig = go.Figure(data=[go.Pie(
-        labels=categories,
-        values=counts,
-        hole=0.4,
-        marker_colors=colors,
-        textinfo='label+percent+value',
-        textfont_size=12
-    )])
-    
-    fig.update_layout(
-        title={
-            'text': 'Phân bố SWOT Analysis',
-            'x': 0.5,
-            'xanchor': 'center',
-            'font': {'size': 18}
-        },
-        showlegend=True,
-        height=400
-    )
+    # Dựng figure từ dict thuần (trace + layout trong một lần khởi tạo)
+    fig = go.Figure({
+        'data': [{
+            'type': 'pie',
+            'labels': categories,
+            'values': counts,
+            'hole': 0.4,
+            'marker': {'colors': colors},
+            'textinfo': 'label+percent+value',
+            'textfont': {'size': 12}
+        }],
+        'layout': {
+            'title': {
+                'text': 'Phân bố SWOT Analysis',
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {'size': 18}
+            },
+            'showlegend': True,
+            'height': 400
+        }
+    })
     
     return fig
 
@@ -903,50 +1131,65 @@ def create_impact_bar_chart(swot_data: Dict[str, Any]) -> go.Figure:
     """
     swot = swot_data.get("SWOT_Analysis", {})
     
-    impact_levels = {'High': 0, 'Medium': 0, 'Low': 0}
-    
-    # Đếm Strengths và Weaknesses theo impact
-    for item in swot.get("Strengths", []):
-        impact = item.get("impact", "Medium")
-        if impact in impact_levels:
-            impact_levels[impact] += 1
-    
-    for item in swot.get("Weaknesses", []):
-        impact = item.get("impact", "Medium")
-        if impact in impact_levels:
-            impact_levels[impact] += 1
-    
-    # Đếm Threats theo risk_level
-    for item in swot.get("Threats", []):
-        risk = item.get("risk_level", "Medium")
-        if risk in impact_levels:
-            impact_levels[risk] += 1
-    
-    fig = go.Figure(data=[
-        go.Bar(
-            x=list(impact_levels.keys()),
-            y=list(impact_levels.values()),
-            marker_color=['#e74c3c', '#f39c12', '#2ecc71'],  # Đỏ, Vàng, Xanh lá
-            text=list(impact_levels.values()),
-            textposition='auto'
-        )
-    ])
-    
-    fig.update_layout(
-        title={
-            'text': 'Phân bố Mức độ Ảnh hưởng/Rủi ro',
-            'x': 0.5,
-            'xanchor': 'center',
-            'font': {'size': 18}
-        },
-        xaxis_title='Mức độ',
-        yaxis_title='Số lượng',
-        height=400
-    )
+    # Đếm Strengths/Weaknesses theo impact và Threats theo risk_level trong một lần Counter
+    level_counts = Counter(chain(
+        (item.get("impact", "Medium") for item in swot.get("Strengths", [])),
+        (item.get("impact", "Medium") for item in swot.get("Weaknesses", [])),
+        (item.get("risk_level", "Medium") for item in swot.get("Threats", []))
+    ))
+    impact_levels = {level: level_counts[level] for level in ('High', 'Medium', 'Low')}
+    
+    # Dựng figure từ dict thuần (trace + layout trong một lần khởi tạo)
+    fig = go.Figure({
+        'data': [{
+            'type': 'bar',
+            'x': list(impact_levels.keys()),
+            'y': list(impact_levels.values()),
+            'marker': {'color': ['#e74c3c', '#f39c12', '#2ecc71']},  # Đỏ, Vàng, Xanh lá
+            'text': list(impact_levels.values()),
+            'textposition': 'auto'
+        }],
+        'layout': {
+            'title': {
+                'text': 'Phân bố Mức độ Ảnh hưởng/Rủi ro',
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {'size': 18}
+            },
+            'xaxis': {'title': {'text': 'Mức độ'}},
+            'yaxis': {'title': {'text': 'Số lượng'}},
+            'height': 400
+        }
+    })
     
     return fig
 
 
+# Cột hiển thị riêng của từng nhóm SWOT: (tiêu đề cột, key trong item)
+_SWOT_TABLE_FIELDS = {
+    "Strengths": (
+        ("Mức độ ảnh hưởng", "impact"),
+        ("Chiến lược tận dụng", "leverage_strategy")
+    ),
+    "Weaknesses": (
+        ("Mức độ ảnh hưởng", "impact"),
+        ("Nguyên nhân gốc rễ", "root_cause"),
+        ("Kế hoạch khắc phục", "mitigation_plan")
+    ),
+    "Opportunities": (
+        ("Gợi ý hành động", "action_idea"),
+        ("Quy mô thị trường", "market_size"),
+        ("Thời gian nắm bắt", "time_to_capture")
+    ),
+    "Threats": (
+        ("Mức độ rủi ro", "risk_level"),
+        ("Xác suất", "probability"),
+        ("Mức độ nghiêm trọng", "severity"),
+        ("Kế hoạch ứng phó", "contingency_plan")
+    )
+}
+
+
 def format_swot_table_data(swot_data: Dict[str, Any], category: str) -> List[Dict[str, str]]:
     """
     Format dữ liệu SWOT để hiển thị trong bảng Streamlit
@@ -961,6 +1204,9 @@ def format_swot_table_data(swot_data: Dict[str, Any], category: str) -> List[Dic
     swot = swot_data.get("SWOT_Analysis", {})
     items = swot.get(category, [])
     
+    # Chọn cột đặc thù của nhóm một lần, không so sánh category trong vòng lặp
+    extra_fields = _SWOT_TABLE_FIELDS.get(category, ())
+    
     formatted_items = []
     for item in items:
         formatted_item = {
@@ -970,28 +1216,11 @@ def format_swot_table_data(swot_data: Dict[str, Any], category: str) -> List[Dic
         
         # Thêm priority score nếu có
         if "priority_score" in item:
-            formatted_item["Điểm ưu tiên"] = item.get("priority_score", "N/A")
+            formatted_item["Điểm ưu tiên"] = item["priority_score"]
         
         # Thêm các trường đặc biệt
-        if category == "Strengths":
-            formatted_item["Mức độ ảnh hưởng"] = item.get("impact", "N/A")
-            formatted_item["Chiến lược tận dụng"] = item.get("leverage_strategy", "N/A")
-        
-        if category == "Weaknesses":
-            formatted_item["Mức độ ảnh hưởng"] = item.get("impact", "N/A")
-            formatted_item["Nguyên nhân gốc rễ"] = item.get("root_cause", "N/A")
-            formatted_item["Kế hoạch khắc phục"] = item.get("mitigation_plan", "N/A")
-        
-        if category == "Opportunities":
-            formatted_item["Gợi ý hành động"] = item.get("action_idea", "N/A")
-            formatted_item["Quy mô thị trường"] = item.get("market_size", "N/A")
-            formatted_item["Thời gian nắm bắt"] = item.get("time_to_capture", "N/A")
-        
-        if category == "Threats":
-            formatted_item["Mức độ rủi ro"] = item.get("risk_level", "N/A")
-            formatted_item["Xác suất"] = item.get("probability", "N/A")
-            formatted_item["Mức độ nghiêm trọng"] = item.get("severity", "N/A")
-            formatted_item["Kế hoạch ứng phó"] = item.get("contingency_plan", "N/A")
+        for label, key in extra_fields:
+            formatted_item[label] = item.get(key, "N/A")
         
         formatted_items.append(formatted_item)
     
@@ -1059,6 +1288,7 @@ def create_tows_matrix_chart(tows_data: Dict[str, List]) -> go.Figure:
     return fig
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
 def create_priority_heatmap(swot_data: Dict[str, Any]) -> go.Figure:
     """
     Tạo Priority Matrix Heatmap (Impact vs Feasibility)
@@ -1090,9 +1320,9 @@ def create_priority_heatmap(swot_data: Dict[str, Any]) -> go.Figure:
     
     df_items = pd.DataFrame(items)
     
-    # Map impact to numeric
-    impact_map = {'High': 3, 'Medium': 2, 'Low': 1}
-    df_items['impact_score'] = df_items['impact'].map(impact_map).fillna(2)
+    # Map impact to numeric: mã Categorical (Low=0, Medium=1, High=2) + 1, giá trị lạ/thiếu (-1) = Medium
+    impact_codes = pd.Categorical(df_items['impact'], categories=['Low', 'Medium', 'High']).codes
+    df_items['impact_score'] = np.where(impact_codes < 0, 2, impact_codes + 1)
     
     # Map category to color
     color_map = {
@@ -1101,33 +1331,40 @@ def create_priority_heatmap(swot_data: Dict[str, Any]) -> go.Figure:
         'Opportunities': '#3498db',
         'Threats': '#f39c12'
     }
-    df_items['color'] = df_items['category'].map(color_map)
     
     # Add jitter to avoid overlapping points
-    import numpy as np
-    np.random.seed(42)
-    df_items['impact_jitter'] = df_items['impact_score'] + np.random.uniform(-0.15, 0.15, len(df_items))
-    df_items['priority_jitter'] = df_items['priority_score'] + np.random.uniform(-0.2, 0.2, len(df_items))
-    
-    fig = go.Figure()
-    
+    # (RNG riêng seed cố định: không đụng tới trạng thái np.random toàn cục; hai cột jitter từ một lần sinh)
+    rng = np.random.default_rng(42)
+    jitter = rng.uniform([-0.15, -0.2], [0.15, 0.2], size=(len(df_items), 2))
+    df_items['impact_jitter'] = df_items['impact_score'] + jitter[:, 0]
+    df_items['priority_jitter'] = df_items['priority_score'] + jitter[:, 1]
+    
+    # Mỗi nhóm một trace (giữ legend bật/tắt theo nhóm): lấy vị trí dòng của từng nhóm
+    # bằng groupby().indices rồi dựng figure từ dict thuần trong một lần khởi tạo
+    group_positions = df_items.groupby('category', sort=False).indices
+    impact_jitter = df_items['impact_jitter'].to_numpy()
+    priority_jitter = df_items['priority_jitter'].to_numpy()
+    topics = df_items['topic'].to_numpy()
+    traces = []
     for category in ['Strengths', 'Weaknesses', 'Opportunities', 'Threats']:
-        df_cat = df_items[df_items['category'] == category]
-        if not df_cat.empty:
-            fig.add_trace(go.Scatter(
-                x=df_cat['impact_jitter'],
-                y=df_cat['priority_jitter'],
-                mode='markers',
-                marker=dict(
-                    size=16,
-                    color=color_map[category],
-                    line=dict(width=2, color='white'),
-                    opacity=0.85
-                ),
-                name=category,
-                customdata=df_cat['topic'],
-                hovertemplate='<b>%{customdata}</b><br>Impact: %{x:.0f}<br>Priority: %{y:.1f}<extra></extra>'
-            ))
+        positions = group_positions.get(category)
+        if positions is not None:
+            traces.append({
+                'type': 'scatter',
+                'x': impact_jitter[positions],
+                'y': priority_jitter[positions],
+                'mode': 'markers',
+                'marker': {
+                    'size': 16,
+                    'color': color_map[category],
+                    'line': {'width': 2, 'color': 'white'},
+                    'opacity': 0.85
+                },
+                'name': category,
+                'customdata': topics[positions],
+                'hovertemplate': '<b>%{customdata}</b><br>Impact: %{x:.0f}<br>Priority: %{y:.1f}<extra></extra>'
+            })
+    fig = go.Figure({'data': traces})
     
     # Add quadrant lines
     fig.add_hline(y=5, line_dash="dash", line_color="gray", opacity=0.5)
@@ -1403,6 +1640,26 @@ def create_action_timeline(action_plan: List[Dict]) -> go.Figure:
     
     return fig
 
+def _coalesce_columns(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """
+    Gộp nhiều cột thành một: mỗi dòng lấy giá trị khác NaN đầu tiên theo thứ tự columns
+    (fillna lần lượt như trước để giữ cách suy kiểu dữ liệu; dừng ngay khi không còn ô trống)
+    
+    Args:
+        df: DataFrame nguồn
+        columns: Danh sách cột theo thứ tự ưu tiên
+    
+    Returns:
+        Series đã gộp
+    """
+    coalesced = df[columns[0]]
+    for col in columns[1:]:
+        if not coalesced.hasnans:
+            break
+        coalesced = coalesced.fillna(df[col])
+    return coalesced
+
+
 def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Tự động trích xuất dữ liệu giá từ DataFrame nếu có
@@ -1413,23 +1670,38 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
     if df is None or df.empty:
         return pd.DataFrame()
         
-    # 1. Tìm cột Item/Product
-    # Thêm keywords 'name', 'desc' để fallback nếu cột 'Item' bị loại do là ID
-    # Thêm unaccented keywords: 'ten mon', 'san pham'
-    item_keywords = ['product', 'item', 'dish', 'menu', 'món', 'tên món', 'sản phẩm', 'food', 'drink', 'name', 'tên', 'desc', 'mô tả', 'ten mon', 'san pham']
+    # 1 + 2. Tìm cột Item/Product và cột Price Candidates trong MỘT lượt duyệt df.columns
+    # (tên cột chỉ lowercase một lần; từ khóa: _PRICE_ITEM_COL_RE / _PRICE_CANDIDATE_COL_RE)
     item_candidates = []
+    price_candidates = []
     
     debug_rejections = [] # DEBUG
 
     for col in df.columns:
         col_lower = col.lower()
-        # Exclude ID/Code columns by Name
-        exclude_match = [x for x in ['code', 'id', 'mã', 'stt', 'no.', 'order', '_no', '_id'] if x in col_lower]
+        
+        # Price column: chỉ cần tên khớp từ khóa và có ít nhất một giá trị số
+        if _PRICE_CANDIDATE_COL_RE.search(col_lower):
+             # Price column basic validation
+             try:
+                if df[col].dtype == 'object':
+                     sample = df[col].astype(str).str.replace(r'[^\d]', '', regex=True)
+                     valid_count = pd.to_numeric(sample, errors='coerce').notna().sum()
+                else:
+                     valid_count = df[col].notna().sum()
+                
+                if valid_count > 0:
+                     price_candidates.append(col)
+             except:
+                pass
+        
+        # Item column: Exclude ID/Code columns by Name
+        exclude_match = _PRICE_ITEM_EXCLUDED_COL_RE.search(col_lower)
         if exclude_match:
-            debug_rejections.append(f"Col '{col}' rejected by name filter: {exclude_match}")
+            debug_rejections.append(f"Col '{col}' rejected by name filter: {exclude_match.group()}")
             continue
             
-        if any(k in col_lower for k in item_keywords) and df[col].dtype == 'object':
+        if _PRICE_ITEM_COL_RE.search(col_lower) and df[col].dtype == 'object':
             # Critical: Check CONTENT to avoid numeric IDs that escaped name filter
             try:
                 # Sample 50 values (increased from 20)
@@ -1446,7 +1718,9 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
                          continue
                          
                     # Check overlap with ID patterns (uuid, long numbers)
-                    if sample.astype(str).str.match(r'^[0-9a-fA-F\-]{10,}$').mean() > 0.5:
+                    # (một lượt regex biên dịch sẵn trên các chuỗi Python, không tạo Series trung gian)
+                    id_hits = sum(1 for value in sample.tolist() if _PRICE_ITEM_ID_VALUE_RE.match(str(value)))
+                    if id_hits / len(sample) > 0.5:
                          debug_rejections.append(f"Col '{col}' rejected by UUID pattern")
                          continue
                          
@@ -1464,26 +1738,6 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
     # DEBUG: Show columns and rejections
     # st.write("DEBUG Columns:", df.columns.tolist())
     # st.write("DEBUG Rejections:", debug_rejections)
-            
-    # 2. Tìm cột Price Candidates
-    # Thêm unaccented keywords: 'gia', 'don gia'
-    price_keywords = ['price', 'cost', 'amount', 'giá', 'đơn giá', 'chi phí', 'tiền', 'gia', 'don gia', 'gia_ban']
-    price_candidates = []
-    
-    for col in df.columns:
-        if any(k in col.lower() for k in price_keywords):
-             # Price column basic validation
-             try:
-                if df[col].dtype == 'object':
-                     sample = df[col].astype(str).str.replace(r'[^\d]', '', regex=True)
-                     valid_count = pd.to_numeric(sample, errors='coerce').notna().sum()
-                else:
-                     valid_count = df[col].notna().sum()
-                
-                if valid_count > 0:
-                     price_candidates.append(col)
-             except:
-                continue
                 
     # 3. Enhanced Strategy: Coalesce Columns (Gộp cột)
     # Vì dữ liệu có thể đến từ nhiều nguồn (Menu file dùng 'Item', Competitor file dùng 'ten_mon')
@@ -1494,15 +1748,19 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
     max_overlap = -1
     
     # 3a. Find Best Pair first (as primary)
-    for i_col in item_candidates:
-        for p_col in price_candidates:
-            if i_col == p_col:
-                continue
-            overlap_count = (df[i_col].notna() & df[p_col].notna()).sum()
-            if overlap_count > max_overlap:
-                max_overlap = overlap_count
-                best_item = i_col
-                best_price = p_col
+    # Số dòng cùng có item & price của MỌI cặp = một phép nhân ma trận mask notna (n_rows x I)^T @ (n_rows x P);
+    # cặp trùng tên cột bị loại (-1); argmax lấy cặp đầu tiên đạt max như vòng lặp lồng nhau trước đây
+    if item_candidates and price_candidates:
+        item_mask = df[item_candidates].notna().to_numpy(dtype=np.int64)
+        price_mask = df[price_candidates].notna().to_numpy(dtype=np.int64)
+        overlap = item_mask.T @ price_mask
+        same_col = np.array([[i_col == p_col for p_col in price_candidates] for i_col in item_candidates])
+        overlap[same_col] = -1
+        i_pos, p_pos = np.unravel_index(overlap.argmax(), overlap.shape)
+        if overlap[i_pos, p_pos] > max_overlap:
+            max_overlap = int(overlap[i_pos, p_pos])
+            best_item = item_candidates[i_pos]
+            best_price = price_candidates[p_pos]
     
     if not best_item or not best_price:
         # Fallback info
@@ -1511,21 +1769,11 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame()
 
     # 3b. Create Coalesced Columns
-    # Copy data from best pair
-    df['_Final_Item'] = df[best_item]
-    df['_Final_Price'] = df[best_price]
-    
-    # Try to fill gaps with other candidates
-    # Sort other candidates by overlap density? Or just iterate
-    for i_col in item_candidates:
-        if i_col != best_item:
-             df['_Final_Item'] = df['_Final_Item'].fillna(df[i_col])
-             
-    for p_col in price_candidates:
-        if p_col != best_price:
-             # Clean price before coalesce?
-             # For simplicity, just coalesce raw values, cleaning happens later
-             df['_Final_Price'] = df['_Final_Price'].fillna(df[p_col])
+    # Cột của cặp tốt nhất đứng đầu, các ứng viên khác lấp chỗ trống theo thứ tự;
+    # gộp trên Series cục bộ rồi gán vào df một lần, bỏ qua các ứng viên khi đã đầy
+    # For simplicity, just coalesce raw values, cleaning happens later
+    df['_Final_Item'] = _coalesce_columns(df, [best_item] + [c for c in item_candidates if c != best_item])
+    df['_Final_Price'] = _coalesce_columns(df, [best_price] + [c for c in price_candidates if c != best_price])
              
     item_col = '_Final_Item'
     price_col = '_Final_Price'
@@ -1534,23 +1782,26 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame()
         
     # 3. Clean Price Data
-    df_clean = df.copy()
+    # Chỉ copy các cột dùng ở các bước sau (item, price, source) thay vì toàn bộ df
+    clean_cols = [item_col, price_col] + (['source'] if 'source' in df.columns else [])
+    df_clean = df[clean_cols].copy()
     
-    # Convert price to numeric
     # Convert price to numeric
     if df_clean[price_col].dtype == 'object':
-        # Handle 'k' suffix (e.g. 25k -> 25000)
-        df_clean[price_col] = df_clean[price_col].astype(str).str.lower().str.replace('k', '000')
-        
-        df_clean[price_col] = pd.to_numeric(
-            df_clean[price_col].str.replace(r'[^\d]', '', regex=True), 
-            errors='coerce'
-        )
+        # Handle 'k' suffix (e.g. 25k -> 25000) rồi bỏ ký tự không phải số:
+        # một lượt duyệt chuỗi Python thay cho chuỗi 3 phép .str (mỗi phép tạo một Series mới)
+        price_digits = [
+            _NON_DIGIT_RE.sub('', str(value).lower().replace('k', '000'))
+            for value in df_clean[price_col].tolist()
+        ]
+        df_clean[price_col] = pd.to_numeric(np.array(price_digits, dtype=object), errors='coerce')
     
     # Handle small numbers logic (e.g. 27 -> 27000)
     # If price is small (e.g. < 1000), assume it's in thousands
     if pd.api.types.is_numeric_dtype(df_clean[price_col]):
-        df_clean[price_col] = df_clean[price_col].apply(lambda x: x * 1000 if 0 < x < 1000 else x)
+        # Vector hóa bằng np.where thay cho apply từng dòng (NaN so sánh False nên giữ nguyên)
+        prices = df_clean[price_col].to_numpy()
+        df_clean[price_col] = np.where((prices > 0) & (prices < 1000), prices * 1000, prices)
     
     df_clean = df_clean.dropna(subset=[item_col, price_col])
     
@@ -1558,28 +1809,27 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
     # User feedback: "tên sp nào có ten my_shop.... thì là của mình"
     # Logic: Check if item name contains keywords, if so, force update Source
     
-    # Keywords
-    myshop_keywords = r'my_shop|myshop|của mình|my store|shop mình'
-    comp_keywords = r'competitor|đối thủ|thị trường|quán khác'
+    # Keywords: _PRICE_MYSHOP_ITEM_RE / _PRICE_COMPETITOR_ITEM_RE (regex biên dịch sẵn)
+    # Tên món lowercase dạng chuỗi Arrow (nếu có): lower/contains/strip chạy bằng kernel C
+    item_series = _as_text(df_clean[item_col]).str.lower()
     
-    item_series = df_clean[item_col].astype(str).str.lower()
+    mask_myshop = item_series.str.contains(_PRICE_MYSHOP_ITEM_RE).to_numpy(dtype=bool)
+    mask_competitor = item_series.str.contains(_PRICE_COMPETITOR_ITEM_RE).to_numpy(dtype=bool)
     
-    mask_myshop = item_series.str.contains(myshop_keywords, regex=True)
-    if mask_myshop.any():
-        df_clean.loc[mask_myshop, 'source'] = 'MY_SHOP'
-        
-    mask_competitor = item_series.str.contains(comp_keywords, regex=True)
-    if mask_competitor.any():
-        df_clean.loc[mask_competitor, 'source'] = 'COMPETITOR'
+    # Gộp hai lần ghi đè thành một lần .loc (tên khớp cả hai thì COMPETITOR thắng như trước)
+    mask_override = mask_myshop | mask_competitor
+    if mask_override.any():
+        override_source = np.where(mask_competitor, 'COMPETITOR', 'MY_SHOP')
+        df_clean.loc[mask_override, 'source'] = override_source[mask_override]
     # ---------------------------------------------------------
     
     # 4. Aggregate
-    # Chuẩn hóa tên món (lowercase, strip)
-    df_clean['item_norm'] = df_clean[item_col].astype(str).str.lower().str.strip()
+    # Chuẩn hóa tên món (lowercase, strip) - dùng lại bản lowercase ở trên
+    df_clean['item_norm'] = item_series.str.strip()
     
     # Calculate avg price per item per source
     if 'source' in df_clean.columns:
-        agg = df_clean.groupby(['item_norm', 'source'])[price_col].mean().reset_index()
+        agg = df_clean.groupby(['item_norm', 'source'], observed=True)[price_col].mean().reset_index()
         # Pivot to get My Shop vs Competitor
         pivot = agg.pivot(index='item_norm', columns='source', values=price_col).reset_index()
     else:
@@ -1588,32 +1838,26 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
         pivot = agg
         pivot['MY_SHOP'] = pivot[price_col]
         
-    # Rename columns to match expected format
-    result_df = pd.DataFrame()
-    result_df['Món'] = pivot['item_norm'].str.title()
-    
     # Robust Source Mapping using partial match
     # Pivot columns are the unique values from 'source' column
     pivot_cols = [c for c in pivot.columns if c != 'item_norm']
     
-    my_price_col = None
-    comp_price_col = None
+    # Tên cột pivot (giá trị source) lowercase một lần cho cả hai bước
+    pivot_col_lowers = [(col, str(col).lower()) for col in pivot_cols]
     
-    # 1. Try to find My Shop column
-    for col in pivot_cols:
-        col_str = str(col).lower()
-        if any(freq in col_str for freq in ['my_shop', 'myshop', 'my shop', 'của mình', 'shop', 'store', 'me']):
-            if not any(neg in col_str for neg in ['bạn', 'competitor', 'đối thủ', 'other']): # avoid false positives if needed
-                 my_price_col = col
-                 break
+    # 1. Try to find My Shop column (avoid false positives với _PIVOT_NOT_MY_SHOP_RE)
+    my_price_col = next(
+        (col for col, col_str in pivot_col_lowers
+         if _PIVOT_MY_SHOP_RE.search(col_str) and not _PIVOT_NOT_MY_SHOP_RE.search(col_str)),
+        None
+    )
     
     # 2. Try to find Competitor column (STRICT)
-    for col in pivot_cols:
-        col_str = str(col).lower()
-        if col != my_price_col:
-            if any(freq in col_str for freq in ['competitor', 'đối thủ', 'thị trường', 'quán khác', 'other']):
-                comp_price_col = col
-                break
+    comp_price_col = next(
+        (col for col, col_str in pivot_col_lowers
+         if col != my_price_col and _PIVOT_COMPETITOR_RE.search(col_str)),
+        None
+    )
     
     # 3. Fallback strategies
     if not my_price_col and not comp_price_col:
@@ -1628,21 +1872,16 @@ def extract_price_data(df: pd.DataFrame) -> pd.DataFrame:
         if remaining:
             my_price_col = remaining[0]
 
-    # Assign values
-    if my_price_col:
-        result_df['Giá của bạn'] = pivot[my_price_col]
-    else:
-        result_df['Giá của bạn'] = 0
-        
-    if comp_price_col:
-        result_df['Giá đối thủ'] = pivot[comp_price_col]
-    else:
-         result_df['Giá đối thủ'] = 0
-        
-    # Fill NaN with 0
-    result_df = result_df.fillna(0)
-    
-    return result_df[['Món', 'Giá của bạn', 'Giá đối thủ']]
+    # Rename columns to match expected format: dựng result_df một lần từ dict các cột
+    # (title bằng str.title của Python trên cột object như trước, kể cả khi item_norm là chuỗi Arrow;
+    # Fill NaN with 0 trên từng cột giá, không fillna/copy cả frame)
+    result_df = pd.DataFrame({
+        'Món': pivot['item_norm'].astype(object).str.title(),
+        'Giá của bạn': pivot[my_price_col].fillna(0) if my_price_col else 0,
+        'Giá đối thủ': pivot[comp_price_col].fillna(0) if comp_price_col else 0
+    })
+    
+    return result_df
 
 def create_price_comparison_chart(price_data: pd.DataFrame):
     """
@@ -1654,47 +1893,46 @@ def create_price_comparison_chart(price_data: pd.DataFrame):
     if price_data is None or price_data.empty:
         return None
         
-    fig = go.Figure()
-    
-    # Giá của bạn
-    fig.add_trace(go.Bar(
-        x=price_data['Món'],
-        y=price_data['Giá của bạn'],
-        name='Giá của bạn',
-        marker_color='#3498db',
-        text=price_data['Giá của bạn'].apply(lambda x: f"{x:,.0f}"),
-        textposition='auto'
-    ))
-    
-    # Giá đối thủ
-    fig.add_trace(go.Bar(
-        x=price_data['Món'],
-        y=price_data['Giá đối thủ'],
-        name='Giá đối thủ',
-        marker_color='#e74c3c',
-        text=price_data['Giá đối thủ'].apply(lambda x: f"{x:,.0f}"),
-        textposition='auto'
-    ))
-    
-    # Calculate % difference for tooltip
-    # Safe division
-    diff_pct = ((price_data['Giá của bạn'] - price_data['Giá đối thủ']) / price_data['Giá đối thủ'].replace(0, 1) * 100).round(1)
-    
-    fig.update_layout(
-        title='So sánh Giá sản phẩm',
-        xaxis_title='Sản phẩm',
-        yaxis_title='Giá (VND)',
-        barmode='group',
-        height=500,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        margin=dict(l=50, r=50, t=80, b=50)
-    )
+    # Dựng figure từ dict thuần (hai trace Bar + layout trong một lần khởi tạo)
+    fig = go.Figure({
+        'data': [
+            # Giá của bạn
+            {
+                'type': 'bar',
+                'x': price_data['Món'],
+                'y': price_data['Giá của bạn'],
+                'name': 'Giá của bạn',
+                'marker': {'color': '#3498db'},
+                'text': [f"{x:,.0f}" for x in price_data['Giá của bạn'].tolist()],
+                'textposition': 'auto'
+            },
+            # Giá đối thủ
+            {
+                'type': 'bar',
+                'x': price_data['Món'],
+                'y': price_data['Giá đối thủ'],
+                'name': 'Giá đối thủ',
+                'marker': {'color': '#e74c3c'},
+                'text': [f"{x:,.0f}" for x in price_data['Giá đối thủ'].tolist()],
+                'textposition': 'auto'
+            }
+        ],
+        'layout': {
+            'title': {'text': 'So sánh Giá sản phẩm'},
+            'xaxis': {'title': {'text': 'Sản phẩm'}},
+            'yaxis': {'title': {'text': 'Giá (VND)'}},
+            'barmode': 'group',
+            'height': 500,
+            'legend': {
+                'orientation': 'h',
+                'yanchor': 'bottom',
+                'y': 1.02,
+                'xanchor': 'right',
+                'x': 1
+            },
+            'margin': {'l': 50, 'r': 50, 't': 80, 'b': 50}
+        }
+    })
     
     return fig
 